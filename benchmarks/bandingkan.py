@@ -0,0 +1,52 @@
+"""
+Bandingkan dua hasil benchmarks.run per skenario.
+
+    python -m benchmarks.bandingkan benchmarks/hasil/A.json benchmarks/hasil/B.json
+
+Kolom menampilkan nilai sebelum -> sesudah dan perubahan relatifnya
+(negatif berarti lebih cepat / lebih hemat memori).
+"""
+import argparse
+import json
+import sys
+
+METRIK = ["p50_ms", "p95_ms", "p99_ms", "rps", "rss_puncak_naik_mb"]
+
+def _perubahan(sebelum, sesudah):
+    if not sebelum:
+        return "    -  "
+    return f"{(sesudah - sebelum) / sebelum * 100:+6.1f}%"
+
+def _kolom(sebelum, sesudah):
+    # Hasil lama (atau platform tanpa /proc) tidak punya metrik RSS
+    if sebelum is None or sesudah is None:
+        return "-"
+    return f"{sebelum:.2f} -> {sesudah:.2f} {_perubahan(sebelum, sesudah)}"
+
+def bandingkan(sebelum: dict, sesudah: dict) -> list:
+    baris = [f"{'skenario':<20}" + "".join(f"{metrik:>32}" for metrik in METRIK)]
+    nama_skenario = list(dict.fromkeys([*sebelum["skenario"], *sesudah["skenario"]]))
+    for nama in nama_skenario:
+        a = sebelum["skenario"].get(nama)
+        b = sesudah["skenario"].get(nama)
+        if a is None or b is None:
+            baris.append(f"{nama:<20}  (hanya ada di {'sesudah' if a is None else 'sebelum'})")
+            continue
+        kolom = "".join(f"{_kolom(a.get(metrik), b.get(metrik)):>32}" for metrik in METRIK)
+        baris.append(f"{nama:<20}{kolom}")
+    return baris
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("sebelum")
+    parser.add_argument("sesudah")
+    args = parser.parse_args()
+
+    with open(args.sebelum) as f:
+        sebelum = json.load(f)
+    with open(args.sesudah) as f:
+        sesudah = json.load(f)
+
+    if sebelum.get("dataset") != sesudah.get("dataset"):
+        print("Peringatan: ukuran dataset kedua run berbeda", file=sys.stderr)
+    print("\n".join(bandingkan(sebelum, sesudah)))
@@ -0,0 +1,249 @@
+"""
+Isi database lokal dengan data sintetis berukuran realistis untuk benchmark.
+
+    MONGO_DB=labnet_bench python -m benchmarks.dataset --reset
+    MONGO_DB=labnet_bench python -m benchmarks.dataset --reset --barang 5000 --fanout 8 --formulir 2000
+
+Membuat barang induk dengan `--fanout` anak per induk (parent_id/children_ids
+dan barang_hirarki), formulir peminjaman beserta baris barang_sirkulasi,
+kelompok tubes beserta anggota, aspek penilaian, nilai dari setiap panelis,
+lalu rekap_nilai. Isi data dibangkitkan dengan seed tetap sehingga volume
+dan distribusinya sama di setiap run (hanya ObjectId yang berbeda).
+
+--reset menghapus isi koleksi-koleksi di atas terlebih dahulu, jadi gunakan
+database khusus benchmark. Hanya berjalan terhadap mongod lokal kecuali
+diberi --izinkan-remote.
+"""
+import argparse
+import asyncio
+import random
+import sys
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId
+from core.config import settings
+from core.logger import logger
+from services.rekap_nilai import JENIS_REKAP, hitungUlangRekapTahun
+from utils.database import connect, close, db
+from utils.indexes import ensure_indexes
+
+KOLEKSI_DATASET = [
+    "users", "barang", "barang_hirarki", "formulir_sirkulasi_barang", "barang_sirkulasi",
+    "kelompok_tubes", "aspek_penilaian_kelompok", "aspek_penilaian_perorangan",
+    "nilai_kelompok", "nilai_perorangan", "rekap_nilai", "sessions",
+]
+
+HOST_LOKAL = {"localhost", "127.0.0.1", "::1"}
+
+# NIM asisten yang dipakai benchmark untuk membuat session
+NIM_ASISTEN_BENCH = 9900001
+
+BATCH = 1000
+
+async def _insert(collection_name: str, docs: list):
+    for i in range(0, len(docs), BATCH):
+        await db[collection_name].insert_many(docs[i:i + BATCH], ordered=False)
+
+def buatUsers(rng: random.Random, jumlah_mahasiswa: int, jumlah_asisten: int):
+    asisten = [
+        {
+            "_id": ObjectId(),
+            "nama": f"Asisten {i}",
+            "name": f"Asisten {i}",
+            "nim": NIM_ASISTEN_BENCH + i,
+            "phone": 6280000000000 + i,
+            "role": "asisten",
+        }
+        for i in range(jumlah_asisten)
+    ]
+    mahasiswa = [
+        {
+            "_id": ObjectId(),
+            "nama": f"Mahasiswa {i}",
+            "name": f"Mahasiswa {i}",
+            "nim": 2000000 + i,
+            "phone": 6281000000000 + rng.randrange(10 ** 8),
+            "role": "mahasiswa",
+        }
+        for i in range(jumlah_mahasiswa)
+    ]
+    return asisten, mahasiswa
+
+def buatBarang(rng: random.Random, jumlah: int, fanout: int, id_pengisi: ObjectId):
+    """`jumlah` barang total: setiap induk punya `fanout` anak (fanout 0 = semua induk)."""
+    sekarang = datetime.now(timezone.utc)
+    barang = []
+    hirarki = []
+    induk = None
+    for i in range(jumlah):
+        jumlah_stok = rng.randint(1, 20)
+        doc = {
+            "_id": ObjectId(),
+            "nama": f"Barang {rng.choice('ABCDEFGHIJ')}{i:06d}",
+            "kode": f"BRG-{i:06d}",
+            "kondisi": rng.choice(["baik", "baik", "baik", "rusak ringan"]),
+            "satuan": rng.choice(["buah", "unit", "set"]),
+            "jumlah": jumlah_stok,
+            "jumlah_terkini": jumlah_stok,
+            "id_pengisi": id_pengisi,
+            "tanggal_pengisian": sekarang,
+            "parent_id": None,
+            "children_ids": [],
+        }
+        if induk is not None and len(induk["children_ids"]) < fanout:
+            doc["parent_id"] = induk["_id"]
+            induk["children_ids"].append(doc["_id"])
+            hirarki.append({"parentId": induk["_id"], "childId": doc["_id"]})
+        else:
+            induk = doc
+        barang.append(doc)
+    return barang, hirarki
+
+def buatSirkulasi(rng: random.Random, jumlah_formulir: int, baris_per_formulir: int, barang: list, id_pencatat: ObjectId):
+    """Formulir peminjaman; jumlah_terkini barang dikurangi sesuai yang dipinjam."""
+    mulai = datetime.now(timezone.utc) - timedelta(days=365)
+    formulir = []
+    barang_sirkulasi = []
+    for i in range(jumlah_formulir):
+        tanggal = (mulai + timedelta(minutes=rng.randrange(365 * 24 * 60))).isoformat()
+        id_formulir = ObjectId()
+        formulir.append({
+            "_id": id_formulir,
+            "nama": f"Peminjam {i}",
+            "notel": f"08{rng.randrange(10 ** 10):010d}",
+            "keterangan": "",
+            "status_sirkulasi": "peminjaman",
+            "sudah_dikembalikan_semua": False,
+            "id_pencatat": id_pencatat,
+            "id_pengubah": id_pencatat,
+            "tanggal_pencatatan": tanggal,
+            "tanggal_perubahan": tanggal,
+        })
+        for item in rng.sample(barang, min(baris_per_formulir, len(barang))):
+            if item["jumlah_terkini"] <= 0:
+                continue
+            item["jumlah_terkini"] -= 1
+            barang_sirkulasi.append({
+                "_id": ObjectId(),
+                "id_formulir": id_formulir,
+                "id_barang": item["_id"],
+                "status_sirkulasi": "peminjaman",
+                "keterangan": "",
+                "jumlah_dicatat": 1,
+                "jumlah_belum_dikembalikan": 1,
+            })
+    return formulir, barang_sirkulasi
+
+def buatAspek(tahun: int, jumlah_induk: int, anak_per_induk: int):
+    """Rubrik dua tingkat; bobot anak dijumlahkan menjadi 100."""
+    aspek = []
+    jumlah_anak = jumlah_induk * anak_per_induk
+    bobot = [100 // jumlah_anak + (1 if i < 100 % jumlah_anak else 0) for i in range(jumlah_anak)]
+    for i in range(jumlah_induk):
+        induk = {"_id": ObjectId(), "nama": f"Aspek {i + 1}", "tahun": tahun, "isParent": True}
+        aspek.append(induk)
+        for j in range(anak_per_induk):
+            aspek.append({
+                "_id": ObjectId(),
+                "nama": f"Aspek {i + 1}.{j + 1}",
+                "tahun": tahun,
+                "isParent": False,
+                "parentId": induk["_id"],
+                "bobot": bobot[i * anak_per_induk + j],
+            })
+    return aspek
+
+def buatNilai(rng: random.Random, subjek: list, aspek: list, panelis: list):
+    """Satu dokumen nilai per (subjek, panelis) untuk setiap aspek anak."""
+    nilai = []
+    aspek_anak = [item for item in aspek if not item["isParent"]]
+    for item_subjek in subjek:
+        for id_penilai in panelis:
+            nilai.append({
+                **item_subjek,
+                "id_penilai": id_penilai,
+                "nilai": [
+                    {"aspek_penilaian_id": item["_id"], "nilai": rng.randint(50, 100)}
+                    for item in aspek_anak
+                ],
+            })
+    return nilai
+
+async def main(args):
+    rng = random.Random(args.seed)
+    connect()
+    try:
+        if args.reset:
+            for collection_name in KOLEKSI_DATASET:
+                await db[collection_name].delete_many({})
+            logger.info("Koleksi dataset dikosongkan: %s", ", ".join(KOLEKSI_DATASET))
+
+        jumlah_mahasiswa = args.kelompok * args.anggota
+        asisten, mahasiswa = buatUsers(rng, jumlah_mahasiswa, args.panelis)
+        await _insert("users", asisten + mahasiswa)
+
+        barang, hirarki = buatBarang(rng, args.barang, args.fanout, asisten[0]["_id"])
+        formulir, barang_sirkulasi = buatSirkulasi(rng, args.formulir, args.baris, barang, asisten[0]["_id"])
+        await _insert("barang", barang)
+        await _insert("barang_hirarki", hirarki)
+        await _insert("formulir_sirkulasi_barang", formulir)
+        await _insert("barang_sirkulasi", barang_sirkulasi)
+
+        kelas = [f"{chr(ord('A') + i)}" for i in range(args.kelas)]
+        kelompok = []
+        for i in range(args.kelompok):
+            anggota = mahasiswa[i * args.anggota:(i + 1) * args.anggota]
+            kelompok.append({
+                "_id": ObjectId(),
+                "nomor": i // args.kelas + 1,
+                "kelas": kelas[i % args.kelas],
+                "tahun": args.tahun,
+                "laporan": "",
+                "id_anggota": [item["_id"] for item in anggota],
+            })
+        await _insert("kelompok_tubes", kelompok)
+
+        aspek_kelompok = buatAspek(args.tahun, 3, 3)
+        aspek_perorangan = buatAspek(args.tahun, 2, 3)
+        await _insert("aspek_penilaian_kelompok", aspek_kelompok)
+        await _insert("aspek_penilaian_perorangan", aspek_perorangan)
+
+        panelis = [item["_id"] for item in asisten]
+        await _insert("nilai_kelompok", buatNilai(
+            rng, [{"id_kelompok": item["_id"]} for item in kelompok], aspek_kelompok, panelis
+        ))
+        await _insert("nilai_perorangan", buatNilai(
+            rng,
+            [{"id_kelompok": item["_id"], "id_mahasiswa": id_anggota} for item in kelompok for id_anggota in item["id_anggota"]],
+            aspek_perorangan, panelis
+        ))
+
+        await ensure_indexes(db)
+        for jenis in JENIS_REKAP:
+            await hitungUlangRekapTahun(jenis, args.tahun)
+
+        logger.info(
+            "Dataset benchmark dibuat: %s barang (%s relasi), %s formulir (%s baris), %s kelompok, %s mahasiswa, %s panelis",
+            len(barang), len(hirarki), len(formulir), len(barang_sirkulasi), len(kelompok), len(mahasiswa), len(panelis)
+        )
+    finally:
+        close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--barang", type=int, default=2000, help="jumlah barang (induk + anak)")
+    parser.add_argument("--fanout", type=int, default=5, help="jumlah anak per barang induk")
+    parser.add_argument("--formulir", type=int, default=1000, help="jumlah formulir sirkulasi")
+    parser.add_argument("--baris", type=int, default=4, help="baris barang_sirkulasi per formulir")
+    parser.add_argument("--kelompok", type=int, default=120, help="jumlah kelompok tubes")
+    parser.add_argument("--anggota", type=int, default=4, help="anggota per kelompok")
+    parser.add_argument("--kelas", type=int, default=4, help="jumlah kelas")
+    parser.add_argument("--panelis", type=int, default=3, help="jumlah asisten penilai")
+    parser.add_argument("--tahun", type=int, default=datetime.now().year)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reset", action="store_true", help="kosongkan koleksi dataset terlebih dahulu")
+    parser.add_argument("--izinkan-remote", action="store_true", help="izinkan host Mongo selain lokal")
+    args = parser.parse_args()
+
+    if settings.mongo_host not in HOST_LOKAL and not args.izinkan_remote:
+        sys.exit(f"Menolak mengisi dataset ke host Mongo '{settings.mongo_host}', gunakan --izinkan-remote")
+    asyncio.run(main(args))
@@ -0,0 +1,270 @@
+"""
+Benchmark endpoint secara in-process (httpx + ASGITransport, tanpa jaringan)
+terhadap mongod lokal yang sudah diisi benchmarks.dataset.
+
+    MONGO_DB=labnet_bench python -m benchmarks.run
+    MONGO_DB=labnet_bench python -m benchmarks.run --iterasi 500 --konkurensi 8 --label sebelum
+    MONGO_DB=labnet_bench python -m benchmarks.run --skenario barang --skenario rekap_kelompok
+
+Hasil (p50/p95/p99, throughput, kenaikan RSS per skenario) disimpan sebagai JSON
+di benchmarks/hasil/ dan bisa dibandingkan dengan benchmarks.bandingkan.
+Skenario post_sirkulasi butuh replica set (transaksi) dan membersihkan
+formulir yang dibuatnya setelah selesai.
+"""
+import argparse
+import asyncio
+import os
+import platform
+import random
+import subprocess
+import sys
+from datetime import datetime
+from pathlib import Path
+from time import perf_counter
+import httpx
+import numpy as np
+import orjson
+from bson import ObjectId
+from pymongo import UpdateOne
+from core.auth import create_session
+from core.config import settings
+from core.logger import logger
+from benchmarks.dataset import HOST_LOKAL, KOLEKSI_DATASET, NIM_ASISTEN_BENCH
+from main import app, lifespan
+from utils.database import db
+
+DIREKTORI_HASIL = Path(__file__).parent / "hasil"
+
+INTERVAL_SAMPEL_RSS = 0.01  # detik
+
+def rssMb():
+    """
+    RSS proses saat ini dari /proc/self/statm (Linux), None jika tidak tersedia.
+    Bukan ru_maxrss: itu high-water mark seumur proses, sehingga nilai satu
+    skenario ikut dipengaruhi skenario sebelumnya.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            halaman = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return halaman * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+class PemantauRss:
+    """Sampel RSS berkala di event loop selama satu skenario."""
+    def __init__(self):
+        self.awal = None
+        self.puncak = None
+        self._tugas = None
+
+    async def _sampel(self):
+        while True:
+            rss = rssMb()
+            if rss is not None and (self.puncak is None or rss > self.puncak):
+                self.puncak = rss
+            await asyncio.sleep(INTERVAL_SAMPEL_RSS)
+
+    def mulai(self):
+        self.awal = self.puncak = rssMb()
+        self._tugas = asyncio.create_task(self._sampel())
+
+    async def selesai(self) -> dict:
+        self._tugas.cancel()
+        akhir = rssMb()
+        if self.awal is None or akhir is None:
+            return {"rss_awal_mb": None, "rss_puncak_naik_mb": None, "rss_selisih_mb": None}
+        puncak = max(self.puncak, akhir)
+        return {
+            "rss_awal_mb": round(self.awal, 2),
+            # kenaikan RSS tertinggi relatif terhadap awal skenario
+            "rss_puncak_naik_mb": round(puncak - self.awal, 2),
+            # RSS akhir - awal (memori yang tidak dilepas setelah skenario)
+            "rss_selisih_mb": round(akhir - self.awal, 2),
+        }
+
+def ringkasLatensi(latensi: list, durasi: float, error: int) -> dict:
+    ms = np.asarray(latensi) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99]) if len(ms) else (0.0, 0.0, 0.0)
+    return {
+        "n": len(latensi),
+        "error": error,
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "rata_ms": round(float(ms.mean()), 3) if len(ms) else 0.0,
+        "maks_ms": round(float(ms.max()), 3) if len(ms) else 0.0,
+        "rps": round(len(latensi) / durasi, 2) if durasi else 0.0,
+    }
+
+async def buatSessionBench() -> str:
+    """Session (atau token, sesuai SESSION_MODE) untuk asisten benchmark, sama seperti /user/login."""
+    user = await db.users.find_one({"nim": NIM_ASISTEN_BENCH, "role": "asisten"})
+    if not user:
+        sys.exit("Asisten benchmark tidak ditemukan, jalankan python -m benchmarks.dataset terlebih dahulu")
+    return await create_session(user)
+
+class KonteksBench:
+    """Id dan parameter dari dataset yang dipakai untuk menyusun request."""
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+        self.formulir_ids = []
+        self.barang_ids = []
+        self.tahun = None
+        self.kelas = []
+        self.formulir_dibuat = []
+        self.barang_dipinjam = {}
+
+    async def muat(self):
+        self.formulir_ids = [str(doc["_id"]) for doc in await db.formulir_sirkulasi_barang.find({}, {"_id": 1}).limit(1000).to_list(length=None)]
+        self.barang_ids = [str(doc["_id"]) for doc in await db.barang.find({"jumlah_terkini": {"$gt": 0}}, {"_id": 1}).limit(1000).to_list(length=None)]
+        kelompok = await db.kelompok_tubes.find_one({}, sort=[("tahun", -1)])
+        if kelompok:
+            self.tahun = kelompok["tahun"]
+            self.kelas = await db.kelompok_tubes.distinct("kelas", {"tahun": self.tahun})
+
+    def paramRekap(self):
+        return [("tahun", self.tahun), *(("kelas", kelas) for kelas in self.kelas)]
+
+    def bodyPostSirkulasi(self):
+        id_formulir = ObjectId()
+        self.formulir_dibuat.append(id_formulir)
+        barang = self.rng.sample(self.barang_ids, min(3, len(self.barang_ids)))
+        for id_barang in barang:
+            self.barang_dipinjam[id_barang] = self.barang_dipinjam.get(id_barang, 0) + 1
+        return {
+            "penanggung_jawab": {
+                "id": str(id_formulir),
+                "nama": "Peminjam Benchmark",
+                "notel": "080000000000",
+                "keterangan": "benchmark",
+                "status_sirkulasi": "peminjaman",
+                "tanggal": datetime.now().isoformat(),
+            },
+            "barang": [{"id": id_barang, "jumlah_dicatat": 1, "keterangan": ""} for id_barang in barang],
+        }
+
+    async def bersihkan(self):
+        """Hapus formulir buatan skenario post_sirkulasi dan kembalikan stok barang."""
+        if not self.formulir_dibuat:
+            return
+        await db.barang_sirkulasi.delete_many({"id_formulir": {"$in": self.formulir_dibuat}})
+        await db.formulir_sirkulasi_barang.delete_many({"_id": {"$in": self.formulir_dibuat}})
+        await db.barang.bulk_write([
+            UpdateOne({"_id": ObjectId(id_barang)}, {"$inc": {"jumlah_terkini": jumlah}})
+            for id_barang, jumlah in self.barang_dipinjam.items()
+        ], ordered=False)
+        self.formulir_dibuat = []
+        self.barang_dipinjam = {}
+
+# nama -> fungsi (client, konteks) yang mengirim satu request
+SKENARIO = {
+    "barang": lambda client, ctx: client.get("/inventaris/barang/"),
+    "barang_halaman": lambda client, ctx: client.get("/inventaris/barang/", params={"limit": 50}),
+    "sirkulasi_halaman": lambda client, ctx: client.get("/inventaris/sirkulasi/", params={"limit": 50}),
+    "sirkulasi_form": lambda client, ctx: client.get("/inventaris/sirkulasi/", params={
+        "id_formulir": ctx.rng.choice(ctx.formulir_ids),
+        "status_sirkulasi": "peminjaman"
+    }),
+    "post_sirkulasi": lambda client, ctx: client.post("/inventaris/sirkulasi/", json=ctx.bodyPostSirkulasi()),
+    "rekap_kelompok": lambda client, ctx: client.get("/tugas_besar/rekap/nilai-kelompok", params=ctx.paramRekap()),
+    "rekap_perorangan": lambda client, ctx: client.get("/tugas_besar/rekap/nilai-perorangan", params=ctx.paramRekap()),
+}
+
+async def jalankanSkenario(client, ctx, kirim, iterasi: int, pemanasan: int, konkurensi: int) -> dict:
+    for _ in range(pemanasan):
+        await kirim(client, ctx)
+
+    latensi = []
+    error = 0
+    sisa = iter(range(iterasi))
+
+    async def pekerja():
+        nonlocal error
+        for _ in sisa:
+            mulai = perf_counter()
+            response = await kirim(client, ctx)
+            latensi.append(perf_counter() - mulai)
+            if response.status_code >= 400:
+                error += 1
+
+    pemantau = PemantauRss()
+    pemantau.mulai()
+    mulai = perf_counter()
+    await asyncio.gather(*(pekerja() for _ in range(konkurensi)))
+    durasi = perf_counter() - mulai
+    return {**ringkasLatensi(latensi, durasi, error), **await pemantau.selesai()}
+
+def gitCommit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+async def main(args):
+    hasil = {
+        "label": args.label,
+        "waktu": datetime.now().isoformat(timespec="seconds"),
+        "commit": gitCommit(),
+        "python": platform.python_version(),
+        "konfigurasi": {
+            "iterasi": args.iterasi,
+            "pemanasan": args.pemanasan,
+            "konkurensi": args.konkurensi,
+            "seed": args.seed,
+            "session_mode": settings.session_mode,
+        },
+        "skenario": {},
+    }
+
+    # ASGITransport tidak menjalankan lifespan, jadi dijalankan manual
+    async with lifespan(app):
+        hasil["dataset"] = {
+            collection_name: await db[collection_name].estimated_document_count()
+            for collection_name in KOLEKSI_DATASET
+        }
+        ctx = KonteksBench(random.Random(args.seed))
+        await ctx.muat()
+        session_id = await buatSessionBench()
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport,
+            base_url="http://bench",
+            headers={"Authorization": f"Bearer {session_id}"},
+            timeout=None
+        ) as client:
+            try:
+                for nama in args.skenario or list(SKENARIO):
+                    ringkasan = await jalankanSkenario(client, ctx, SKENARIO[nama], args.iterasi, args.pemanasan, args.konkurensi)
+                    hasil["skenario"][nama] = ringkasan
+                    logger.info(
+                        "%s: p50 %.2f ms, p95 %.2f ms, p99 %.2f ms, %s rps, %s error",
+                        nama, ringkasan["p50_ms"], ringkasan["p95_ms"], ringkasan["p99_ms"], ringkasan["rps"], ringkasan["error"]
+                    )
+            finally:
+                await ctx.bersihkan()
+                await db.sessions.delete_one({"_id": session_id})
+
+    keluaran = Path(args.keluaran) if args.keluaran else DIREKTORI_HASIL / f"{datetime.now():%Y%m%d_%H%M%S}{'_' + args.label if args.label else ''}.json"
+    keluaran.parent.mkdir(parents=True, exist_ok=True)
+    keluaran.write_bytes(orjson.dumps(hasil, option=orjson.OPT_INDENT_2))
+    logger.info("Hasil benchmark disimpan di %s", keluaran)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--skenario", action="append", choices=list(SKENARIO), help="default: semua skenario")
+    parser.add_argument("--iterasi", type=int, default=200, help="request yang diukur per skenario")
+    parser.add_argument("--pemanasan", type=int, default=10, help="request pemanasan per skenario (tidak diukur)")
+    parser.add_argument("--konkurensi", type=int, default=1, help="request bersamaan per skenario")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--label", default="", help="label run, ikut di nama berkas hasil")
+    parser.add_argument("--keluaran", help="path berkas JSON hasil")
+    parser.add_argument("--izinkan-remote", action="store_true", help="izinkan host Mongo selain lokal")
+    args = parser.parse_args()
+
+    if settings.mongo_host not in HOST_LOKAL and not args.izinkan_remote:
+        sys.exit(f"Menolak menjalankan benchmark terhadap host Mongo '{settings.mongo_host}', gunakan --izinkan-remote")
+    asyncio.run(main(args))
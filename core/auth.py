@@ -1,9 +1,20 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import time
 import uuid
 from datetime import datetime, timedelta
+import orjson
 from fastapi import HTTPException, Depends, Request
 from fastapi.security import APIKeyHeader, HTTPAuthorizationCredentials, HTTPBearer
 from utils.database import db
 from bson import ObjectId
+from bson.errors import InvalidId
+from core.config import settings
+from core.cache import TTLCache
+from core.logger import logger
+from utils.dataloader import loader
 
 # Konfigurasi session
 SESSION_EXPIRE_MINUTES = 60 * 24  # 1 hari
@@ -11,11 +22,85 @@ SESSION_HEADER = "Authorization"
 
 api_key_header = APIKeyHeader(name=SESSION_HEADER, auto_error=False)
 
+security = HTTPBearer()
+
+# -----------------------------
+# Mode "mongo": session disimpan di koleksi sessions
+# -----------------------------
+# Cache session_id -> (dokumen user, waktu cek terakhir), supaya request
+# terautentikasi tidak selalu membayar dua round trip ke Mongo. Cache ini per
+# proses worker; keberadaan session dicek ulang setiap AUTH_RECHECK_INTERVAL
+# detik supaya logout di worker lain ikut berlaku.
+session_cache = TTLCache(settings.auth_cache_size, settings.auth_cache_ttl)
+
+# -----------------------------
+# Mode "token": token bertanda tangan HMAC, tanpa baca database
+# -----------------------------
+# Format: base64url(payload JSON).base64url(HMAC-SHA256(secret, payload))
+# payload: {"uid", "role", "nim", "exp" (epoch detik), "jti"}
+# Token yang di-logout dicatat di koleksi session_revocations (TTL sampai exp)
+# dan disalin ke set di memori yang disegarkan berkala oleh setiap worker.
+revoked_jti = set()
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+def _tanda_tangan(payload_b64: str) -> str:
+    return _b64encode(hmac.new(settings.session_secret.encode(), payload_b64.encode(), hashlib.sha256).digest())
+
+def buatToken(user: dict) -> str:
+    payload = {
+        "uid": str(user["_id"]),
+        "role": user["role"],
+        "nim": user["nim"],
+        "exp": int(time.time()) + SESSION_EXPIRE_MINUTES * 60,
+        "jti": uuid.uuid4().hex,
+    }
+    payload_b64 = _b64encode(orjson.dumps(payload))
+    return f"{payload_b64}.{_tanda_tangan(payload_b64)}"
+
+def verifikasiToken(token: str) -> dict:
+    """Kembalikan payload token yang sah; raise HTTPException 401 jika tidak."""
+    payload_b64, _, signature = token.partition(".")
+    if not signature or not hmac.compare_digest(signature.encode(), _tanda_tangan(payload_b64).encode()):
+        raise HTTPException(status_code=401, detail="Invalid or expired session")
+    try:
+        payload = orjson.loads(_b64decode(payload_b64))
+    except ValueError:
+        raise HTTPException(status_code=401, detail="Invalid or expired session")
+    if not isinstance(payload, dict) or payload.get("exp", 0) < time.time() or payload.get("jti") in revoked_jti:
+        raise HTTPException(status_code=401, detail="Invalid or expired session")
+    return payload
+
+async def segarkanRevokasi():
+    """Muat ulang jti yang dicabut dan belum kedaluwarsa ke memori."""
+    global revoked_jti
+    cursor = db.session_revocations.find({"expires_at": {"$gt": datetime.utcnow()}}, {"_id": 1})
+    revoked_jti = {doc["_id"] async for doc in cursor}
+
+async def jalankanSegarkanRevokasi():
+    """Task latar (dijalankan di lifespan pada mode token)."""
+    while True:
+        try:
+            await segarkanRevokasi()
+        except Exception as e:
+            logger.warning("Gagal menyegarkan daftar token yang dicabut: %s", e)
+        await asyncio.sleep(settings.session_revocation_refresh)
+
+# -----------------------------
+# Session
+# -----------------------------
 async def create_session(user: dict) -> str:
+    if settings.session_mode == "token":
+        return buatToken(user)
+
     session_id = str(uuid.uuid4())
     session_data = {
-        "_id": ObjectId(session_id),
-        "user_id": ObjectId(user["_id"]),
+        "_id": session_id,
+        "user_id": str(user["_id"]),
         "nim": user["nim"],
         "role": user["role"],
         "created_at": datetime.utcnow(),
@@ -24,17 +109,69 @@ async def create_session(user: dict) -> str:
     await db.sessions.insert_one(session_data)
     return session_id
 
-security = HTTPBearer()
+async def revoke_session(token: str, user: dict):
+    """Logout: mode token mencabut token ini, mode mongo menghapus semua session user."""
+    if settings.session_mode == "token":
+        payload = verifikasiToken(token)
+        await db.session_revocations.update_one(
+            {"_id": payload["jti"]},
+            {"$set": {"expires_at": datetime.utcfromtimestamp(payload["exp"])}},
+            upsert=True
+        )
+        revoked_jti.add(payload["jti"])
+        return
+
+    await db.sessions.delete_many({"user_id": str(user["_id"])})
+    invalidate_user_cache(user["_id"])
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """
+    Mode token: user minimal dari payload ({_id, role, nim}) tanpa baca database;
+    endpoint yang butuh profil lengkap membacanya sendiri (lihat /user/me).
+    Mode mongo: dokumen user lengkap.
+    """
+    if settings.session_mode == "token":
+        payload = verifikasiToken(credentials.credentials)
+        try:
+            return {"_id": ObjectId(payload["uid"]), "role": payload["role"], "nim": payload["nim"]}
+        except (InvalidId, KeyError):
+            raise HTTPException(status_code=401, detail="Invalid or expired session")
+
     session_id = credentials.credentials  # isi Bearer
+    entry = session_cache.get(session_id)
+    if entry is not None:
+        user, dicek_pada = entry
+        if time.monotonic() - dicek_pada < settings.auth_recheck_interval:
+            return user
+        # Logout di worker lain hanya menghapus baris sessions, jadi entri yang
+        # sudah lewat AUTH_RECHECK_INTERVAL dicek ulang (satu baca by _id)
+        session = await db.sessions.find_one({"_id": session_id}, {"expires_at": 1})
+        if not session:
+            session_cache.pop(session_id)
+            raise HTTPException(status_code=401, detail="Invalid or expired session")
+        session_cache.set(session_id, (user, time.monotonic()), _sisaUmurSession(session))
+        return user
+
     session = await db.sessions.find_one({"_id": session_id})
+    if not session:
+        raise HTTPException(status_code=401, detail="Invalid or expired session")
     # if not session or session["expires_at"] < datetime.utcnow():
     #     raise HTTPException(status_code=401, detail="Invalid or expired session")
-    
-    # Kalau pakai ObjectId di user_id:
-    user = await db.users.find_one({"_id": ObjectId(session["user_id"])})
+
+    # Lewat loader: user yang sama di request ini (mis. pencatat) tidak dibaca ulang
+    user = await loader("users").load(session["user_id"])
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    
+
+    session_cache.set(session_id, (user, time.monotonic()), _sisaUmurSession(session))
     return user
+
+def _sisaUmurSession(session: dict):
+    # Jangan simpan lebih lama dari umur session
+    if session.get("expires_at"):
+        return (session["expires_at"] - datetime.utcnow()).total_seconds()
+    return None
+
+def invalidate_user_cache(user_id):
+    """Buang semua session ter-cache milik user di worker ini (dipanggil saat logout/ubah profil)."""
+    return session_cache.discard_where(lambda entry: entry[0]["_id"] == user_id)
@@ -1,3 +1,5 @@
+from typing import Literal, Optional
+from pydantic import model_validator
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -8,9 +10,86 @@ class Settings(BaseSettings):
     mongo_db: str
     mongo_auth_db: str = "admin"
 
+    # Connection pool, kompresi, timeout dan read preference Mongo.
+    # None berarti memakai default pymongo.
+    mongo_max_pool_size: Optional[int] = None
+    mongo_min_pool_size: Optional[int] = None
+    mongo_max_idle_time_ms: Optional[int] = None
+    mongo_wait_queue_timeout_ms: Optional[int] = None
+    mongo_server_selection_timeout_ms: Optional[int] = None
+    mongo_compressors: Optional[str] = None  # mis. "zstd,snappy,zlib"
+    mongo_zlib_compression_level: Optional[int] = None
+    mongo_read_preference: Optional[str] = None  # primary, primaryPreferred, secondary, ...
+    mongo_replica_set: Optional[str] = None
+
+    # Session: "mongo" (koleksi sessions) atau "token" (token HMAC tanpa baca
+    # database, logout lewat daftar revokasi yang disegarkan berkala)
+    session_mode: Literal["mongo", "token"] = "mongo"
+    session_secret: Optional[str] = None
+    session_revocation_refresh: int = 30  # detik
+
+    # Cache session -> user di get_current_user
+    auth_cache_size: int = 1024
+    auth_cache_ttl: int = 60  # detik
+    # Cek ulang keberadaan session (mode mongo) setelah sekian detik, supaya
+    # logout di worker lain berlaku tanpa menunggu AUTH_CACHE_TTL
+    auth_recheck_interval: int = 5  # detik
+
+    # Cache response aspek penilaian (per koleksi, tahun, versi)
+    aspek_cache_size: int = 64
+    aspek_cache_ttl: int = 300  # detik
+    # Interval penyegaran versi aspek dari Mongo (perubahan rubrik di worker lain)
+    aspek_versi_refresh: int = 5  # detik
+
+    # Profiler query lambat (opsional): command Mongo di atas ambang dicatat
+    # beserta ringkasan explain-nya. None berarti profiler mati.
+    profiler_slow_ms: Optional[int] = None
+    profiler_buffer_size: int = 100
+
+    # Peringatan jika satu request menjalankan lebih dari sekian command Mongo
+    # (indikasi pola N+1). 0 berarti tanpa peringatan; header Server-Timing tetap dikirim.
+    mongo_command_budget: int = 25
+
+    # Ekspor xlsx: jumlah thread render dan ekspor yang boleh antre;
+    # di atas itu request ekspor dijawab 503 dengan Retry-After
+    export_workers: int = 2
+    export_max_antrean: int = 4
+    export_retry_after: int = 10  # detik
+
+    # Logging: level, format ("text" atau "json" lines) dan rotasi berkas.
+    # log_file kosong berarti hanya ke console.
+    log_level: str = "INFO"
+    log_format: str = "text"
+    log_file: str = "logs/app.log"
+    log_max_bytes: int = 10 * 1024 * 1024
+    log_backup_count: int = 5
+
+    @model_validator(mode="after")
+    def cek_session_secret(self):
+        if self.session_mode == "token" and len(self.session_secret or "") < 32:
+            raise ValueError("SESSION_SECRET minimal 32 karakter wajib diisi untuk SESSION_MODE=token")
+        return self
+
     @property
     def mongo_uri(self):
         return f"mongodb://{self.mongo_username}:{self.mongo_password}@{self.mongo_host}:{self.mongo_port}/{self.mongo_db}?authSource={self.mongo_auth_db}"
 
+    @property
+    def mongo_client_options(self) -> dict:
+        options = {
+            "maxPoolSize": self.mongo_max_pool_size,
+            "minPoolSize": self.mongo_min_pool_size,
+            "maxIdleTimeMS": self.mongo_max_idle_time_ms,
+            "waitQueueTimeoutMS": self.mongo_wait_queue_timeout_ms,
+            "serverSelectionTimeoutMS": self.mongo_server_selection_timeout_ms,
+            "compressors": self.mongo_compressors,
+            "zlibCompressionLevel": self.mongo_zlib_compression_level,
+            "readPreference": self.mongo_read_preference,
+            "replicaSet": self.mongo_replica_set,
+        }
+        return {key: value for key, value in options.items() if value is not None}
+
     class Config:
         env_file = ".env"
+
+settings = Settings()
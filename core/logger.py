@@ -1,5 +1,15 @@
+import atexit
 import logging
+import os
+import queue
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
+import orjson
+from core.config import settings
+
+# Request id aktif, diisi RequestIdMiddleware dan ikut ke thread executor Motor lewat context
+request_id_var = ContextVar("request_id", default=None)
 
 # ANSI escape codes
 LOG_COLORS = {
@@ -11,32 +21,102 @@ LOG_COLORS = {
     "RESET": "\033[0m",
 }
 
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
 # Formatter berwarna untuk terminal
 class ColorFormatter(logging.Formatter):
     def format(self, record):
         color = LOG_COLORS.get(record.levelname, LOG_COLORS["RESET"])
         reset = LOG_COLORS["RESET"]
+        # Warnai salinan record; record asli dipakai juga oleh handler lain (file)
+        record = logging.makeLogRecord(record.__dict__)
         record.levelname = f"{color}{record.levelname}{reset}"
-        record.msg = f"{color}{record.msg}{reset}"
+        record.msg = f"{color}{record.getMessage()}{reset}"
+        record.args = None
         return super().format(record)
 
-# Formatter standar (untuk file)
-plain_formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+# Formatter JSON lines (satu object per baris)
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        data = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+        }
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        return orjson.dumps(data, default=str).decode()
+
+class RequestIdFilter(logging.Filter):
+    """Tempel request id ke record di thread pemanggil, sebelum record masuk antrean."""
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+def _buat_handlers():
+    if settings.log_format == "json":
+        stream_formatter = file_formatter = JsonFormatter()
+    else:
+        stream_formatter = ColorFormatter(LOG_FORMAT)
+        file_formatter = logging.Formatter(LOG_FORMAT)
 
-# Pastikan folder logs ada
-Path("logs").mkdir(exist_ok=True)
+    # Stream handler (console)
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(stream_formatter)
+    handlers = [stream_handler]
 
-# Stream handler (console)
-stream_handler = logging.StreamHandler()
-stream_handler.setFormatter(ColorFormatter("%(asctime)s - %(levelname)s - %(message)s"))
+    # File handler (no color) dengan rotasi berdasarkan ukuran
+    if settings.log_file:
+        Path(settings.log_file).parent.mkdir(parents=True, exist_ok=True)
+        file_handler = RotatingFileHandler(
+            settings.log_file,
+            maxBytes=settings.log_max_bytes,
+            backupCount=settings.log_backup_count,
+            encoding="utf-8"
+        )
+        file_handler.setFormatter(file_formatter)
+        handlers.append(file_handler)
+    return handlers
 
-# File handler (no color)
-file_handler = logging.FileHandler("logs/app.log", encoding="utf-8")
-file_handler.setFormatter(plain_formatter)
+# Logger hanya menaruh record ke antrean; I/O console/file dikerjakan
+# thread QueueListener sehingga tidak memblokir event loop
+_log_queue = queue.SimpleQueue()
+queue_handler = QueueHandler(_log_queue)
+queue_handler.addFilter(RequestIdFilter())
+
+_listener = None
+_listener_pid = None
+
+def start_logging():
+    """Jalankan QueueListener untuk proses ini (idempoten per proses)."""
+    global _log_queue, _listener, _listener_pid
+    if _listener is not None and _listener_pid == os.getpid():
+        return
+    if _listener is not None:
+        # Proses hasil fork: thread listener milik parent tidak ikut, buat antrean baru
+        _log_queue = queue.SimpleQueue()
+        queue_handler.queue = _log_queue
+    _listener = QueueListener(_log_queue, *_buat_handlers(), respect_handler_level=True)
+    _listener.start()
+    _listener_pid = os.getpid()
+
+def stop_logging():
+    """Hentikan listener dan kirim sisa record di antrean."""
+    global _listener, _listener_pid
+    if _listener is not None and _listener_pid == os.getpid():
+        _listener.stop()
+    _listener = None
+    _listener_pid = None
 
 # Logger utama
 logger = logging.getLogger("myapp")
-logger.setLevel(logging.INFO)
-logger.addHandler(stream_handler)
-logger.addHandler(file_handler)
+logger.setLevel(settings.log_level.upper())
+logger.addHandler(queue_handler)
 logger.propagate = False
+
+start_logging()
+# Worker gunicorn (--preload) di-fork dari master setelah modul ini di-import
+os.register_at_fork(after_in_child=start_logging)
+atexit.register(stop_logging)
@@ -0,0 +1,181 @@
+import os
+import threading
+from bisect import bisect_left
+from pymongo import monitoring
+
+# Batas bucket histogram (detik / byte), ditentukan di awal supaya observasi
+# cukup bisect + increment integer tanpa alokasi
+HTTP_DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+HTTP_SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+MONGO_DURATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # slot terakhir untuk +Inf
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+# -----------------------------
+# HTTP (hanya disentuh dari thread event loop)
+# -----------------------------
+http_in_flight = 0
+_http_duration = {}
+_http_size = {}
+
+def request_started():
+    global http_in_flight
+    http_in_flight += 1
+
+def request_finished(route: str, method: str, status: int, duration: float, size: int):
+    global http_in_flight
+    http_in_flight -= 1
+
+    key = (route, method, status)
+    histogram = _http_duration.get(key)
+    if histogram is None:
+        histogram = _http_duration[key] = Histogram(HTTP_DURATION_BUCKETS)
+        _http_size[key] = Histogram(HTTP_SIZE_BUCKETS)
+    histogram.observe(duration)
+    _http_size[key].observe(size)
+
+# -----------------------------
+# Mongo (dipanggil dari thread executor Motor)
+# -----------------------------
+# Setiap thread menulis ke shard miliknya sendiri sehingga tidak perlu lock;
+# shard digabung saat /metrics di-scrape.
+class _MongoShard:
+    __slots__ = ("durations", "failures", "pending")
+
+    def __init__(self):
+        self.durations = {}
+        self.failures = {}
+        self.pending = {}
+
+_mongo_shards = []
+_local = threading.local()
+
+def _mongo_shard():
+    shard = getattr(_local, "shard", None)
+    if shard is None:
+        shard = _local.shard = _MongoShard()
+        _mongo_shards.append(shard)
+    return shard
+
+def command_collection(event) -> str:
+    """Nama koleksi target sebuah command Mongo (kosong untuk command level database)."""
+    if event.command_name == "getMore":
+        target = event.command.get("collection")
+    else:
+        target = event.command.get(event.command_name)
+    return target if isinstance(target, str) else ""
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    def started(self, event):
+        _mongo_shard().pending[event.request_id] = command_collection(event)
+
+    def succeeded(self, event):
+        self._observe(event, False)
+
+    def failed(self, event):
+        self._observe(event, True)
+
+    def _observe(self, event, failed):
+        shard = _mongo_shard()
+        key = (shard.pending.pop(event.request_id, ""), event.command_name)
+        histogram = shard.durations.get(key)
+        if histogram is None:
+            histogram = shard.durations[key] = Histogram(MONGO_DURATION_BUCKETS)
+        histogram.observe(event.duration_micros / 1_000_000)
+        if failed:
+            shard.failures[key] = shard.failures.get(key, 0) + 1
+
+mongo_command_metrics = MongoCommandMetrics()
+
+# -----------------------------
+# Collector tambahan
+# -----------------------------
+# Modul lain bisa mendaftarkan fungsi yang mengembalikan baris teks
+# Prometheus siap pakai (mis. utils.export_pool)
+_collectors = []
+
+def register_collector(collector):
+    _collectors.append(collector)
+
+# -----------------------------
+# Format teks Prometheus
+# -----------------------------
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def labels(**label) -> str:
+    """
+    Label Prometheus, selalu diawali worker="<pid>". Di belakang gunicorn setiap
+    scrape dijawab worker acak, jadi tanpa label ini counter tampak mundur;
+    agregasi lintas worker dengan sum without (worker).
+    """
+    label = {"worker": os.getpid(), **label}
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in label.items())
+
+def _render_histogram(lines, name, help_text, histograms: dict, label_names):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} histogram")
+    for key, histogram in sorted(histograms.items()):
+        series = labels(**dict(zip(label_names, key)))
+        cumulative = 0
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{series},le="{bound}"}} {cumulative}')
+        cumulative += histogram.counts[-1]
+        lines.append(f'{name}_bucket{{{series},le="+Inf"}} {cumulative}')
+        lines.append(f"{name}_sum{{{series}}} {histogram.sum}")
+        lines.append(f"{name}_count{{{series}}} {cumulative}")
+
+def _merge_mongo_shards():
+    durations = {}
+    failures = {}
+    for shard in list(_mongo_shards):
+        for key, histogram in shard.durations.copy().items():
+            merged = durations.get(key)
+            if merged is None:
+                merged = durations[key] = Histogram(MONGO_DURATION_BUCKETS)
+            merged.counts = [a + b for a, b in zip(merged.counts, histogram.counts)]
+            merged.sum += histogram.sum
+        for key, count in shard.failures.copy().items():
+            failures[key] = failures.get(key, 0) + count
+    return durations, failures
+
+def render() -> str:
+    lines = [
+        "# HELP http_requests_in_flight Request HTTP yang sedang diproses.",
+        "# TYPE http_requests_in_flight gauge",
+        f"http_requests_in_flight{{{labels()}}} {http_in_flight}",
+    ]
+    _render_histogram(
+        lines, "http_request_duration_seconds", "Latensi request HTTP per route.",
+        _http_duration, ("route", "method", "status")
+    )
+    _render_histogram(
+        lines, "http_response_size_bytes", "Ukuran body response HTTP per route.",
+        _http_size, ("route", "method", "status")
+    )
+
+    mongo_durations, mongo_failures = _merge_mongo_shards()
+    _render_histogram(
+        lines, "mongo_command_duration_seconds", "Durasi command Mongo per koleksi.",
+        mongo_durations, ("collection", "command")
+    )
+    lines.append("# HELP mongo_command_failures_total Command Mongo yang gagal per koleksi.")
+    lines.append("# TYPE mongo_command_failures_total counter")
+    for (collection, command), count in sorted(mongo_failures.items()):
+        lines.append(f"mongo_command_failures_total{{{labels(collection=collection, command=command)}}} {count}")
+
+    for collector in _collectors:
+        lines.extend(collector())
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,9 @@
+from uvicorn.workers import UvicornWorker
+
+class UvloopWorker(UvicornWorker):
+    """Worker gunicorn berbasis uvicorn dengan uvloop + httptools dan lifespan aktif."""
+    CONFIG_KWARGS = {
+        "loop": "uvloop",
+        "http": "httptools",
+        "lifespan": "on",
+    }
@@ -0,0 +1,23 @@
+# Konfigurasi gunicorn untuk production (run_prod.sh)
+import multiprocessing
+import os
+
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '8000')}"
+
+# Worker async: satu worker per core sudah cukup, bisa di-override lewat WORKERS.
+# Setiap worker punya cache sendiri; invalidasi session lintas worker lewat
+# cek ulang berkala (AUTH_RECHECK_INTERVAL) atau daftar revokasi (mode token)
+workers = int(os.getenv("WORKERS") or multiprocessing.cpu_count())
+worker_class = "core.worker.UvloopWorker"
+
+# Aplikasi di-load sekali di master lalu di-fork; aman karena client Mongo
+# baru dibuat di lifespan masing-masing worker
+preload_app = True
+
+# Shutdown graceful: worker diberi waktu menyelesaikan request berjalan
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))
+keepalive = 5
+
+accesslog = "-"
+errorlog = "-"
@@ -1,12 +1,82 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from middleware.object_id_encoder_middleware import ObjectIdEncoderMiddleware
-from routers import user, inventaris
+from pymongo.errors import OperationFailure
+from routers import user, inventaris, admin
 from routers.tugas_besar import router as tugas_besar_router
-from utils.database import db
+from utils.database import db, connect, close, cekDukunganTransaksi
+from utils.indexes import ensure_indexes
+from utils.profiler import slow_query_profiler
 from core.logger import logger
+from core import metrics
+from core.auth import jalankanSegarkanRevokasi, segarkanRevokasi
+from core.config import settings
+from services.tugas_besar import jalankanSegarkanVersiAspek, segarkanVersiAspek
+from services.rekap_nilai import isiRekapNilaiJikaKosong
+from middleware.metrics_middleware import MetricsMiddleware
+from middleware.request_id_middleware import RequestIdMiddleware
+from middleware.query_budget_middleware import QueryBudgetMiddleware
+from middleware.dataloader_middleware import DataLoaderMiddleware
+from utils.json_codec import BSONJSONResponse, daftarkanEncoderBSON
 
-app = FastAPI()
+async def startup():
+    if not await cekDukunganTransaksi():
+        logger.error(
+            "MongoDB bukan anggota replica set (atau mongos): transaksi tidak tersedia, "
+            "semua penulisan sirkulasi akan ditolak. Jalankan mongod dengan --replSet, "
+            "rs.initiate() sekali, lalu isi MONGO_REPLICA_SET (lihat .example.env)."
+        )
+
+    existing_collections = await db.list_collection_names()
+    # Buat view 'barang_aktif' dari 'barang'
+    if not "barang_aktif" in existing_collections:
+        try:
+            await db.command({
+                "create": "barang_aktif",
+                "viewOn": "barang",
+                "pipeline": [
+                    { "$match": { "tanggal_dihapus": { "$exists": False } } }
+                ]
+            })
+        except OperationFailure as e:
+            # Worker lain bisa lebih dulu membuat view saat startup bersamaan
+            if e.code != 48:  # NamespaceExists
+                raise
+    logger.info("View 'barang_aktif' berhasil dibuat saat startup.")
+
+    await ensure_indexes(db)
+    logger.info("Index koleksi berhasil diperiksa saat startup.")
+
+    tahun_rekap = await isiRekapNilaiJikaKosong()
+    if tahun_rekap:
+        logger.info("rekap_nilai masih kosong, diisi untuk tahun %s.", ", ".join(map(str, tahun_rekap)))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Client Mongo dibuat dan ditutup per worker
+    client = connect()
+    slow_query_profiler.attach(asyncio.get_running_loop(), client)
+    await startup()
+
+    # Salinan per worker dari state bersama di Mongo, disegarkan berkala
+    await segarkanVersiAspek()
+    tugas_latar = [asyncio.create_task(jalankanSegarkanVersiAspek())]
+    if settings.session_mode == "token":
+        await segarkanRevokasi()
+        tugas_latar.append(asyncio.create_task(jalankanSegarkanRevokasi()))
+
+    yield
+
+    for tugas in tugas_latar:
+        tugas.cancel()
+    slow_query_profiler.detach()
+    close()
+    logger.info("Koneksi Mongo ditutup.")
+
+daftarkanEncoderBSON()
+app = FastAPI(default_response_class=BSONJSONResponse, lifespan=lifespan)
 
 origins = [
     "http://localhost:8080",      # Vue dev server default
@@ -22,28 +92,33 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Request-ID"],
 )
-app.add_middleware(ObjectIdEncoderMiddleware)
+
+# Memo DataLoader (users, barang, ...) per request
+app.add_middleware(DataLoaderMiddleware)
+
+# Jumlah command Mongo per request (Server-Timing + peringatan budget)
+app.add_middleware(QueryBudgetMiddleware)
+
+# Request id untuk korelasi log (termasuk log dari thread executor Motor)
+app.add_middleware(RequestIdMiddleware)
+
+# Metrics paling luar supaya latensi mencakup semua middleware lain
+app.add_middleware(MetricsMiddleware)
 
 # Include routers
 app.include_router(user.router, prefix="/user", tags=["User"])
 app.include_router(tugas_besar_router, prefix="/tugas_besar", tags=["Tubes"])
 app.include_router(inventaris.router, prefix="/inventaris", tags=["Inventaris"])
-
-@app.on_event("startup")
-async def startup():
-    existing_collections = await db.list_collection_names()
-    # Buat view 'barang_aktif' dari 'barang'
-    if not "barang_aktif" in existing_collections:
-        await db.command({
-            "create": "barang_aktif",
-            "viewOn": "barang",
-            "pipeline": [
-                { "$match": { "tanggal_dihapus": { "$exists": False } } }
-            ]
-        })
-    logger.info("View 'barang_aktif' berhasil dibuat saat startup.")
+app.include_router(admin.router, prefix="/admin", tags=["Admin"])
 
 @app.get("/")
 def read_root():
     return {"message": "Welcome to Main Service API"}
+
+@app.get("/metrics", include_in_schema=False)
+async def read_metrics():
+    # async supaya render berjalan di event loop yang sama dengan pencatat HTTP.
+    # Metrics per proses worker, setiap seri berlabel worker="<pid>"
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,17 @@
+from utils.dataloader import dataloader_var
+
+class DataLoaderMiddleware:
+    """Middleware ASGI murni: setiap request mendapat set DataLoader (memo) sendiri."""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = dataloader_var.set({})
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            dataloader_var.reset(token)
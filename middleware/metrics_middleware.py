@@ -0,0 +1,42 @@
+from time import perf_counter
+from core import metrics
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI murni (tanpa BaseHTTPMiddleware) yang mencatat latensi,
+    status, dan ukuran body response per template route ke core.metrics.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = perf_counter()
+        status = 500
+        size = 0
+
+        async def send_with_metrics(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        metrics.request_started()
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            # Router Starlette mengisi scope["route"] setelah route cocok;
+            # template (mis. /inventaris/barang/{id}) menjaga kardinalitas label tetap kecil
+            route = scope.get("route")
+            metrics.request_finished(
+                route.path if route is not None else "unmatched",
+                scope["method"],
+                status,
+                perf_counter() - start,
+                size
+            )
@@ -0,0 +1,43 @@
+from core.config import settings
+from core.logger import logger
+from utils.query_budget import StatistikQuery, query_stats_var, serverTiming
+
+class QueryBudgetMiddleware:
+    """
+    Middleware ASGI murni: hitung command Mongo dan total durasinya per request,
+    kirim sebagai header Server-Timing, dan beri peringatan jika melebihi
+    settings.mongo_command_budget. Response streaming (ekspor) yang masih query
+    setelah header terkirim tetap dihitung untuk peringatan budget.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = StatistikQuery(induk=query_stats_var.get())
+
+        async def send_with_server_timing(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (b"server-timing", serverTiming(stats).encode("latin-1"))]
+            await send(message)
+
+        token = query_stats_var.set(stats)
+        try:
+            await self.app(scope, receive, send_with_server_timing)
+        finally:
+            query_stats_var.reset(token)
+            budget = settings.mongo_command_budget
+            if budget and stats.jumlah > budget:
+                route = scope.get("route")
+                logger.warning(
+                    "%s %s memakai %s command Mongo (budget %s, %.2f ms): %s",
+                    scope["method"],
+                    route.path if route is not None else scope["path"],
+                    stats.jumlah,
+                    budget,
+                    stats.durasi_ms,
+                    stats.rincian()
+                )
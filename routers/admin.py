@@ -0,0 +1,37 @@
+import os
+from fastapi import APIRouter, Depends
+from core.auth import get_current_user, session_cache
+from utils.database import db
+from services.tugas_besar import aspek_cache
+from utils.indexes import audit_indexes
+from utils.pool_monitor import pool_statistik
+from utils.profiler import slow_query_profiler
+from core.config import settings
+from utils.json_codec import ORJSONRoute
+
+router = APIRouter(dependencies=[Depends(get_current_user)], route_class=ORJSONRoute)
+
+@router.get("/cache")
+async def get_cache_stats():
+    return {
+        "worker": os.getpid(),
+        "session": session_cache.stats(),
+        "aspek_penilaian": aspek_cache.stats()
+    }
+
+@router.get("/indexes")
+async def get_index_audit():
+    return await audit_indexes(db)
+
+@router.get("/pool")
+async def get_pool_stats():
+    return {"worker": os.getpid(), "servers": pool_statistik.stats()}
+
+@router.get("/profiler")
+async def get_profiler():
+    return {"worker": os.getpid(), "aktif": settings.profiler_slow_ms is not None, **slow_query_profiler.stats()}
+
+@router.delete("/profiler")
+async def clear_profiler():
+    slow_query_profiler.clear()
+    return {"message": "Buffer profiler dikosongkan", "worker": os.getpid()}
@@ -1,59 +1,50 @@
-from typing import Literal
+from typing import Literal, Optional
 from fastapi import APIRouter, HTTPException, Query, Request, Depends
 from core.auth import get_current_user
 from utils.database import db, convert_objectid, flatten_with_relations, convert_to_objectid
 from bson import ObjectId
 from datetime import datetime, timezone
-from services.inventaris import get_barang_pipeline, sync_barang_hirarki
+from services.inventaris import get_barang_pipeline, getHalamanBarang, sync_barang_hirarki, set_hirarki_barang
 from utils.generate_file_response import generate_excel_multisheet_response
+from utils.dataloader import loader
+from utils.json_codec import BSONJSONResponse, ORJSONRoute
 
-router = APIRouter(dependencies=[Depends(get_current_user)])
+router = APIRouter(dependencies=[Depends(get_current_user)], route_class=ORJSONRoute)
+
+KOLOM_BARANG = ["nama", "kode", "kondisi", "satuan", "jumlah", "jumlah_terkini"]
 
 @router.get("/")
-async def get_barang(status: Literal["semua", "dipinjam", "tidak_dipinjam"] = "semua", format: str = Query("json")):
+async def get_barang(
+    status: Literal["semua", "dipinjam", "tidak_dipinjam"] = "semua",
+    format: str = Query("json"),
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    after: Optional[str] = None,
+    total: bool = False
+):
+    if format == "json" and limit:
+        result = await getHalamanBarang(status, limit, after, total)
+        return BSONJSONResponse(convert_objectid(result))
+
     cursor = db.barang_aktif.aggregate(get_barang_pipeline(status))
-    result = await cursor.to_list(length=None)
     if format == "json":
-        return convert_objectid(result)
+        result = await cursor.to_list(length=None)
+        return BSONJSONResponse(convert_objectid(result))
     elif format == "excel":
-        def flatten_with_indent(data: list, indent_char: str = "»") -> list:
-            result = []
-            for parent in data:
-                parent_data = {k: v for k, v in parent.items() if k != "id" and k != "children"}
-                parent_data["Level"] = 0
-                result.append(parent_data)
-
+        # Satu cursor mengisi dua sheet: induk dan anak (dengan kode induknya)
+        async def split_to_sheets():
+            async for parent in cursor:
+                yield "Induk", parent
                 for child in parent.get("children", []):
-                    child_data = {k: v for k, v in child.items() if k != "id"}
-                    if "nama" in child_data:
-                        child_data["nama"] = f"{indent_char} {child_data['nama']}"
-                    child_data["Level"] = 1
-                    result.append(child_data)
+                    yield "Anak", {**child, "parent_kode": parent.get("kode")}
 
-            return result
-    
-        def split_to_sheets(data: list) -> dict:
-            parents = [
-                {k: v for k, v in parent.items() if k != "id" and k != "children"}
-                for parent in data
-            ]
-
-            children = [
-                {
-                    **{k: v for k, v in child.items() if k != "id"},
-                    "parent_kode": parent.get("kode")
-                }
-                for parent in data
-                for child in parent.get("children", [])
-            ]
-
-            return {
-                "Induk": parents,
-                "Anak": children
-            }
-
-        sheet_data = split_to_sheets(result)
-        return generate_excel_multisheet_response(sheet_data, filename="daftar_barang.xlsx")
+        return generate_excel_multisheet_response(
+            split_to_sheets(),
+            sheets={
+                "Induk": KOLOM_BARANG,
+                "Anak": KOLOM_BARANG + ["parent_kode"]
+            },
+            filename="daftar_barang.xlsx"
+        )
 
 @router.get("/saran-isi")
 async def get_saran_isi():
@@ -85,6 +76,7 @@ async def post_barang(
     tanggal_pengisian = datetime.now(timezone.utc)
 
     if flatten_data:
+        set_hirarki_barang(flatten_data, relation_data)
         for data in flatten_data:
             data["id_pengisi"] = object_id_user
             data["tanggal_pengisian"] = tanggal_pengisian
@@ -108,7 +100,7 @@ async def put_barang(
     tanggal_diubah = datetime.now(timezone.utc)
     object_barang_id = ObjectId(body["id"])
 
-    data_lama = await db.barang.find_one({"_id": object_barang_id})
+    data_lama = await loader("barang").load(object_barang_id)
     if not data_lama:
         return {"error": "Data tidak ditemukan."}
     
@@ -133,6 +125,8 @@ async def put_barang(
         }
     )
 
+    loader("barang").clear(object_barang_id)
+
     result_update_barang_hirarki = await sync_barang_hirarki(object_barang_id, body["children"])
     return {
         "jumlah_update_barang_lama": result_update_barang.modified_count,
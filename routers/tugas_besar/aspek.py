@@ -1,10 +1,11 @@
-from fastapi import APIRouter, Query, Request, Depends
+from fastapi import APIRouter, Query, Request, Response, Depends
 from core.auth import get_current_user
 from utils.database import db
-from bson import ObjectId
-from services.tugas_besar import getAspekPenilaianKelompok, getAspekPenilaianPerorangan
+from services.tugas_besar import getAspekPenilaianKelompok, getAspekPenilaianPerorangan, rencanakanDiffAspek, getAspekPenilaianTerversi, naikkanVersiAspek
+from services.rekap_nilai import hitungUlangRekapTahun, jenisRekapDariKoleksiAspek
+from utils.json_codec import ORJSONRoute
 
-router = APIRouter(dependencies=[Depends(get_current_user)])
+router = APIRouter(dependencies=[Depends(get_current_user)], route_class=ORJSONRoute)
 
 async def upsert_aspek_penilaian(
     body: list,
@@ -12,83 +13,57 @@ async def upsert_aspek_penilaian(
     get_result_function: callable
 ):
     if len(body) == 0:
-        return []
+        # Bentuk response sama dengan body berisi, supaya client cukup menangani satu bentuk
+        return {
+            "aspek_penilaian": [],
+            "diff": {"inserted": 0, "updated": 0, "unchanged": 0, "deleted": 0}
+        }
 
-    upserted_ids = []
-    processed_ids = []
     tahun = body[0]["tahun"]
     collection = db[collection_name]
 
-    async def update_or_upsert(document_id, update_data):
-        filter_query = {"_id": ObjectId(document_id)} if document_id else update_data
-        result = await collection.update_one(
-            filter_query,
-            {"$set": update_data},
-            upsert=True
-        )
-
-        if result.upserted_id:
-            new_id = str(result.upserted_id)
-            upserted_ids.append(new_id)
-            processed_ids.append(ObjectId(new_id))
-            return new_id
-        else:
-            processed_ids.append(ObjectId(document_id))
-            return document_id
-
-    for item in body:
-        parent_id = item.get("id")
-        parent_data = {
-            "kriteria": item["kriteria"],
-            "tahun": tahun,
-            "isParent": True
-        }
-
-        parent_id = await update_or_upsert(parent_id, parent_data)
-        if parent_id is None:
-            continue
-
-        for child in item.get("children", []):
-            await update_or_upsert(child.get("id"), {
-                "kriteria": child["kriteria"],
-                "bobot": child["bobot"],
-                "tahun": tahun,
-                "isParent": False,
-                "parentId": ObjectId(parent_id)
-            })
-
-    # Hapus parent yang tidak diproses dan anak-anaknya
-    unprocessed_parents = await collection.find({
-        "tahun": tahun,
-        "isParent": True,
-        "_id": {"$nin": processed_ids}
-    }).to_list(None)
-
-    parent_ids_to_delete = [doc["_id"] for doc in unprocessed_parents]
-
-    await collection.delete_many({
-        "$or": [
-            {"_id": {"$in": parent_ids_to_delete}},
-            {"parentId": {"$in": parent_ids_to_delete}}
-        ]
-    })
+    # Muat pohon lama sekali, lalu tulis semua perubahan dalam satu bulk_write.
+    # ordered=True: insert/update dijalankan sebelum delete di akhir.
+    doc_lama = await collection.find({"tahun": tahun}).to_list(length=None)
+    operasi_tulis, diff = rencanakanDiffAspek(body, doc_lama, tahun)
+    if operasi_tulis:
+        await collection.bulk_write(operasi_tulis, ordered=True)
+        await naikkanVersiAspek(collection_name, tahun)
+        # bobot bisa berubah, rekap tahun ini dihitung ulang
+        await hitungUlangRekapTahun(jenisRekapDariKoleksiAspek(collection_name), tahun)
+
+    return {
+        "aspek_penilaian": await get_result_function([tahun]),
+        "diff": diff
+    }
+
+async def response_aspek_terversi(
+    request: Request,
+    collection_name: str,
+    tahun: int,
+    get_result_function: callable
+):
+    body, etag = await getAspekPenilaianTerversi(collection_name, tahun, get_result_function)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "no-cache",
+        "Access-Control-Expose-Headers": "ETag",
+    }
 
-    # Hapus child yang tidak diproses
-    await collection.delete_many({
-        "tahun": tahun,
-        "isParent": False,
-        "_id": {"$nin": processed_ids}
-    })
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        if etag in tags or "*" in tags:
+            return Response(status_code=304, headers=headers)
 
-    return await get_result_function([tahun])
+    return Response(content=body, media_type="application/json", headers=headers)
 
 # -----------------------------
 # Routes
 # -----------------------------
 @router.get("/penilaian-kelompok")
-async def get_aspek_penilaian_kelompok(tahun: int = Query(...)):
-    doc = await getAspekPenilaianKelompok([tahun])
-    return doc
+async def get_aspek_penilaian_kelompok(request: Request, tahun: int = Query(...)):
+    return await response_aspek_terversi(request, "aspek_penilaian_kelompok", tahun, getAspekPenilaianKelompok)
 
 @router.post("/penilaian-kelompok")
 async def post_aspek_penilaian_kelompok(request: Request):
@@ -100,9 +75,8 @@ async def post_aspek_penilaian_kelompok(request: Request):
     )
 
 @router.get("/penilaian-perorangan")
-async def get_aspek_penilaian_perorangan(tahun: int = Query(...)):
-    doc = await getAspekPenilaianPerorangan([tahun])
-    return doc
+async def get_aspek_penilaian_perorangan(request: Request, tahun: int = Query(...)):
+    return await response_aspek_terversi(request, "aspek_penilaian_perorangan", tahun, getAspekPenilaianPerorangan)
 
 @router.post("/penilaian-perorangan")
 async def post_aspek_penilaian_perorangan(request: Request):
@@ -1,10 +1,12 @@
-from fastapi import APIRouter, HTTPException, Query, Request, Depends
+from fastapi import APIRouter, HTTPException, Query, Request, Depends, UploadFile, File
 from core.auth import get_current_user
-from utils.database import db, convert_objectid
+from utils.database import convert_objectid
 from bson import ObjectId
 from services.tugas_besar import getKelompokTubes, getNilaiKelompokTubes, getNilaiPerorangan
+from services.penilaian import simpanNilaiMassal, bacaBerkasNilai
+from utils.json_codec import ORJSONRoute
 
-router = APIRouter(dependencies=[Depends(get_current_user)])
+router = APIRouter(dependencies=[Depends(get_current_user)], route_class=ORJSONRoute)
 
 # -----------------------------
 # Routes
@@ -29,19 +31,13 @@ async def post_nilai_kelompok(
     current_user: dict = Depends(get_current_user)
 ):
     body = await request.json()
-    id_kelompok = ObjectId(body["id_kelompok"])
-    body["id_kelompok"] = ObjectId(body["id_kelompok"])
     object_id_penilai = ObjectId(current_user["_id"])
-    for index, nilai in enumerate(body['nilai']):
-        body['nilai'][index]['aspek_penilaian_id'] = ObjectId(nilai['aspek_penilaian_id'])
-    
-    await db.nilai_kelompok.update_one(
-        {"id_kelompok": body["id_kelompok"], "id_penilai": object_id_penilai},
-        {"$set": body},
-        upsert=True
-    )
 
-    doc = await getNilaiKelompokTubes(id_kelompok, current_user["_id"])
+    hasil = await simpanNilaiMassal(object_id_penilai, [body], [])
+    if hasil["errors"]:
+        raise HTTPException(status_code=400, detail=hasil["errors"])
+
+    doc = await getNilaiKelompokTubes(body["id_kelompok"], current_user["_id"])
     return convert_objectid(doc)
 
 @router.get("/nilai-perorangan")
@@ -61,26 +57,53 @@ async def post_nilai_perorangan(
     
     if not isinstance(body, list):
         raise HTTPException(status_code=400, detail="Payload harus berupa array")
+    if len(body) == 0:
+        return []
     object_id_penilai = ObjectId(current_user["_id"])
     id_kelompok = body[0]["id_kelompok"]
-    object_id_kelompok = ObjectId(id_kelompok)
     for item in body:
         if 'id_mahasiswa' not in item or 'nilai' not in item:
             raise HTTPException(status_code=400, detail="Setiap item harus memiliki 'id_mahasiswa' dan 'nilai'")
-        
-        item['id_penilai'] = object_id_penilai
-        item["id_kelompok"] = object_id_kelompok
-        item["id_mahasiswa"] = ObjectId(item["id_mahasiswa"])
-        
-        # Konversi ObjectId pada aspek_penilaian_id
-        for index, nilai in enumerate(item['nilai']):
-            item['nilai'][index]['aspek_penilaian_id'] = ObjectId(nilai['aspek_penilaian_id'])
+        item["id_kelompok"] = id_kelompok
+
+    hasil = await simpanNilaiMassal(object_id_penilai, [], body)
+    if hasil["errors"]:
+        raise HTTPException(status_code=400, detail=hasil["errors"])
 
-        # Lakukan upsert
-        result = await db.nilai_perorangan.update_one(
-            {"id_mahasiswa": item["id_mahasiswa"], "id_penilai": object_id_penilai},
-            {"$set": item},
-            upsert=True
-        )
     hasil = await getNilaiPerorangan(id_kelompok, current_user["_id"])
     return hasil
+
+@router.post("/nilai-massal")
+async def post_nilai_massal(
+    request: Request,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Simpan banyak set nilai sekaligus.
+    Payload: { "kelompok": [{ id_kelompok, nilai }], "perorangan": [{ id_kelompok, id_mahasiswa, nilai }] }
+    """
+    body = await request.json()
+    if not isinstance(body, dict):
+        raise HTTPException(status_code=400, detail="Payload harus berupa object")
+
+    return await simpanNilaiMassal(
+        ObjectId(current_user["_id"]),
+        body.get("kelompok", []),
+        body.get("perorangan", [])
+    )
+
+@router.post("/nilai-massal/berkas")
+async def post_nilai_massal_berkas(
+    berkas: UploadFile = File(...),
+    current_user: dict = Depends(get_current_user)
+):
+    """Import nilai dari berkas CSV/XLSX dengan kolom: jenis, id_kelompok, id_mahasiswa, aspek_penilaian_id, nilai."""
+    isi = await berkas.read()
+    try:
+        nilai_kelompok, nilai_perorangan, errors = bacaBerkasNilai(berkas.filename or "", isi)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Berkas tidak dapat dibaca: {e}")
+
+    hasil = await simpanNilaiMassal(ObjectId(current_user["_id"]), nilai_kelompok, nilai_perorangan)
+    hasil["errors"] = errors + hasil["errors"]
+    return hasil
@@ -1,14 +1,15 @@
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.security import HTTPAuthorizationCredentials
 from pydantic import BaseModel
 from typing import Optional
 from bson import ObjectId
 
 from utils.database import db, convert_objectid
-from core.auth import get_current_user
-import uuid
-from datetime import datetime, timedelta
+from core.auth import get_current_user, invalidate_user_cache, create_session, revoke_session, security
+from utils.dataloader import loader
+from utils.json_codec import ORJSONRoute
 
-router = APIRouter()
+router = APIRouter(route_class=ORJSONRoute)
 
 # -------------------------------
 # Data Models
@@ -43,17 +44,7 @@ async def login_user(login: LoginRequest):
     if not user:
         raise HTTPException(status_code=404, detail="User tidak ditemukan")
 
-    # Buat session baru
-    session_id = str(uuid.uuid4())
-    session_data = {
-        "_id": session_id,
-        "user_id": str(user["_id"]),
-        "nim": user["nim"],
-        "role": user["role"],
-        "created_at": datetime.utcnow(),
-        "expires_at": datetime.utcnow() + timedelta(days=1)
-    }
-    await db.sessions.insert_one(session_data)
+    session_id = await create_session(user)
 
     return {
         "session_token": session_id,
@@ -61,8 +52,11 @@ async def login_user(login: LoginRequest):
     }
 
 @router.post("/logout")
-async def logout_user(current_user=Depends(get_current_user)):
-    await db.sessions.delete_many({"user_id": str(current_user["_id"])})
+async def logout_user(
+    current_user=Depends(get_current_user),
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+):
+    await revoke_session(credentials.credentials, current_user)
     return {"message": "Logged out successfully"}
 
 @router.post("/")
@@ -77,7 +71,11 @@ async def create_user(user: UserCreate):
 
 @router.get("/me", response_model=UserOut)
 async def get_profile(current_user=Depends(get_current_user)):
-    return convert_objectid(current_user)
+    # Mode token hanya membawa _id/role/nim, profil lengkap dibaca di sini
+    user = await loader("users").load(current_user["_id"])
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    return convert_objectid(user)
 
 @router.put("/edit-profile")
 async def edit_profile(data: EditProfile, current_user=Depends(get_current_user)):
@@ -86,5 +84,7 @@ async def edit_profile(data: EditProfile, current_user=Depends(get_current_user)
         raise HTTPException(status_code=400, detail="Tidak ada perubahan")
 
     await db.users.update_one({"_id": current_user["_id"]}, {"$set": update_data})
+    invalidate_user_cache(current_user["_id"])
+    loader("users").clear(current_user["_id"])
     updated_user = await db.users.find_one({"_id": current_user["_id"]})
     return convert_objectid(updated_user)
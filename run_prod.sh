@@ -6,5 +6,5 @@ if [ -f ".env.production" ]; then
   export $(grep -v '^#' .env.production | xargs)
 fi
 
-echo "🚀 Menjalankan FastAPI (production mode tanpa Gunicorn)..."
-exec uvicorn "$APP_MODULE" --host "$HOST" --port "$PORT"
+echo "🚀 Menjalankan FastAPI (production mode, gunicorn + ${WORKERS:-auto} worker uvicorn)..."
+exec gunicorn "$APP_MODULE" -c gunicorn.conf.py
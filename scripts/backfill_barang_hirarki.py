@@ -0,0 +1,21 @@
+"""
+Isi parent_id/children_ids di dokumen barang dari koleksi barang_hirarki.
+Jalankan sekali setelah deploy:
+
+    python -m scripts.backfill_barang_hirarki
+"""
+import asyncio
+from services.inventaris import backfill_barang_hirarki
+from core.logger import logger
+from utils.database import connect, close
+
+async def main():
+    connect()
+    try:
+        result = await backfill_barang_hirarki()
+        logger.info("Backfill hirarki barang selesai: %s", result)
+    finally:
+        close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
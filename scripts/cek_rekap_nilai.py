@@ -0,0 +1,40 @@
+"""
+Bandingkan rekap_nilai termaterialisasi dengan perhitungan penuh.
+
+    python -m scripts.cek_rekap_nilai --tahun 2025
+    python -m scripts.cek_rekap_nilai --tahun 2025 --perbaiki
+
+Dengan --perbaiki, rekap tahun tersebut dihitung ulang sebelum diperiksa
+(juga dipakai untuk mengisi rekap_nilai pertama kali).
+"""
+import argparse
+import asyncio
+import sys
+from services.rekap_nilai import JENIS_REKAP, hitungUlangRekapTahun, periksaKonsistensiRekap
+from core.logger import logger
+from utils.database import connect, close
+
+async def main(tahun: list, perbaiki: bool):
+    connect()
+    try:
+        if perbaiki:
+            for item_tahun in tahun:
+                for jenis in JENIS_REKAP:
+                    jumlah = await hitungUlangRekapTahun(jenis, item_tahun)
+                    logger.info("Rekap %s tahun %s dihitung ulang: %s dokumen", jenis, item_tahun, jumlah)
+
+        selisih = await periksaKonsistensiRekap(tahun)
+    finally:
+        close()
+
+    for item in selisih:
+        logger.warning("Rekap tidak konsisten: %s", item)
+    logger.info("Pemeriksaan rekap selesai: %s selisih", len(selisih))
+    return len(selisih)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tahun", type=int, action="append", required=True)
+    parser.add_argument("--perbaiki", action="store_true")
+    args = parser.parse_args()
+    sys.exit(1 if asyncio.run(main(args.tahun, args.perbaiki)) else 0)
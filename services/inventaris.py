@@ -1,44 +1,54 @@
+import asyncio
+import time
 from typing import Optional
 from typing import Literal
 from bson import ObjectId
-from pymongo import UpdateOne, InsertOne, DeleteOne
+from fastapi import HTTPException
+from pymongo import UpdateOne, UpdateMany, InsertOne, DeleteOne, DeleteMany
+from pymongo.read_concern import ReadConcern
+from pymongo.write_concern import WriteConcern
 from datetime import datetime, timezone
-from utils.database import db
-import copy
+from utils.database import db, get_client, get_transaksi_didukung
+from utils.pagination import keyset_stages, keyset_page
+from utils.dataloader import loader
 from core.logger import logger
 
-def get_barang_pipeline(
+# Urutan keyset pagination, didukung index barang (parent_id, nama, _id)
+# dan formulir_sirkulasi_barang (tanggal_pencatatan, _id)
+SORT_BARANG = [("nama", 1), ("_id", 1)]
+SORT_SIRKULASI = [("tanggal_pencatatan", -1), ("_id", -1)]
+
+def get_barang_filter(
     status: Literal["semua", "dipinjam", "tidak_dipinjam"] = "semua"
+):
+    # Hirarki sudah didenormalisasi ke dokumen barang (parent_id, children_ids),
+    # lihat sync_barang_hirarki dan backfill_barang_hirarki
+    filter_barang = { "parent_id": None }
+    if(status == "tidak_dipinjam"):
+        filter_barang["jumlah_terkini"] = { "$gt": 0 }
+    elif(status == "dipinjam"):
+        filter_barang["$expr"] = { "$lt" : ["$jumlah_terkini", "$jumlah"] }
+    return filter_barang
+
+def get_barang_pipeline(
+    status: Literal["semua", "dipinjam", "tidak_dipinjam"] = "semua",
+    limit: Optional[int] = None,
+    after: Optional[str] = None
 ):
     pipeline = [
         {
-            "$lookup": {
-                "from": "barang_hirarki",
-                "localField": "_id",
-                "foreignField": "childId",
-                "as": "isChild"
-            }
-        },
-        {
-            "$match": {
-                "isChild": { "$eq": [] }
-            }
-        },
-        {
-            "$lookup": {
-                "from": "barang_hirarki",
-                "localField": "_id",
-                "foreignField": "parentId",
-                "as": "relations"
-            }
-        },
+            "$match": get_barang_filter(status)
+        }
+    ]
+    if limit:
+        pipeline.extend(keyset_stages(SORT_BARANG, limit, after))
+
+    pipeline.extend([
         {
             "$lookup": {
                 "from": "barang",
-                "let": { "children_ids": "$relations.childId" },
-                "pipeline": [
-                    { "$match": { "$expr": { "$in": ["$_id", "$$children_ids"] } } }
-                ],
+                "localField": "children_ids",
+                "foreignField": "_id",
                 "as": "children"
             }
         },
@@ -53,18 +63,31 @@ def get_barang_pipeline(
                 "jumlah_terkini": 1,
                 "children": 1
             }
+        },
+        {
+            "$project": {
+                "children.parent_id": 0,
+                "children.children_ids": 0
+            }
         }
-    ]
-
-    if(status == "tidak_dipinjam"):
-        pipeline.insert(0, { "$match": { "jumlah_terkini": { "$gt": 0 } } })
-    elif(status == "dipinjam"):
-        pipeline.insert(0, { "$match": { "$expr" : { "$lt" : ["$jumlah_terkini", "$jumlah"] }}})
+    ])
 
     return pipeline
 
-def getPipeLineFormSirkulasi(id_formulir: Optional[str] = None):
-    pipeline = [
+def getPipeLineFormSirkulasi(
+    id_formulir: Optional[str] = None,
+    limit: Optional[int] = None,
+    after: Optional[str] = None
+):
+    pipeline = []
+    if id_formulir:
+        pipeline.append({ "$match": { "_id": ObjectId(id_formulir) }})
+    elif limit:
+        pipeline.extend(keyset_stages(SORT_SIRKULASI, limit, after))
+    else:
+        pipeline.append({ "$sort": dict(SORT_SIRKULASI) })
+
+    pipeline.append(
         {
             "$lookup": {
             "from": "barang_sirkulasi",
@@ -73,10 +96,7 @@ def getPipeLineFormSirkulasi(id_formulir: Optional[str] = None):
                 {
                 "$match": {
                     "$expr": {
-                        "$eq": [
-                            { "$toObjectId": "$id_formulir" },
-                            "$$formulirId"
-                        ]
+                        "$eq": [ "$id_formulir", "$$formulirId" ]
                     }
                 }
                 },
@@ -97,32 +117,39 @@ def getPipeLineFormSirkulasi(id_formulir: Optional[str] = None):
             ],
             "as": "data_barang_sirkulasi"
             }
-        },
-    ]
-
-    if id_formulir:
-        pipeline.insert(0, { "$match": { "_id": ObjectId(id_formulir) }})
-    else:
-        pipeline.extend([
-            {
-                "$lookup": {
-                "from": "users",
-                "localField": "id_pencatat",
-                "foreignField": "_id",
-                "as": "pencatat"
-                }
-            },
-            {
-                "$unwind": {
-                "path": "$pencatat",
-                "preserveNullAndEmptyArrays": True
-                }
-            },
-            { "$sort": { "tanggal_pencatatan": -1 } }
-        ])
+        }
+    )
+    # pencatat tidak di-$lookup di sini, lihat lengkapiPencatat
     return pipeline
 
-async def upsertFormulirSirkulasiBarang(data_penanggung_jawab, object_user_id, is_insert: bool):
+async def lengkapiPencatat(daftar_formulir: list):
+    """Isi field `pencatat` dari users lewat loader (satu $in, memo per request)."""
+    daftar_pencatat = await loader("users").load_many([formulir.get("id_pencatat") for formulir in daftar_formulir])
+    for formulir, pencatat in zip(daftar_formulir, daftar_pencatat):
+        if pencatat is not None:
+            formulir["pencatat"] = pencatat
+    return daftar_formulir
+
+PENCATAT_CHUNK = 500  # formulir per putaran loader saat streaming laporan
+
+async def aiterFormulirDenganPencatat(cursor):
+    """
+    Stream formulir dari `cursor` dengan `pencatat` terisi. Formulir ditampung
+    per PENCATAT_CHUNK supaya pencatat satu chunk dibaca dengan satu $in,
+    bukan satu putaran loader per formulir.
+    """
+    chunk = []
+    async for formulir in cursor:
+        chunk.append(formulir)
+        if len(chunk) >= PENCATAT_CHUNK:
+            for formulir_lengkap in await lengkapiPencatat(chunk):
+                yield formulir_lengkap
+            chunk = []
+    if chunk:
+        for formulir_lengkap in await lengkapiPencatat(chunk):
+            yield formulir_lengkap
+
+def siapkanFormulirSirkulasi(data_penanggung_jawab, object_user_id, is_insert: bool):
     pj = data_penanggung_jawab
     id_formulir = ObjectId(pj["id"])
     now_iso = datetime.fromisoformat(pj["tanggal"]).isoformat()
@@ -146,39 +173,15 @@ async def upsertFormulirSirkulasiBarang(data_penanggung_jawab, object_user_id, i
         formulir_common["id_pencatat"] = object_user_id
         formulir_common["tanggal_pencatatan"] = now_iso
 
-    result = await db.formulir_sirkulasi_barang.update_one(
+    operation = UpdateOne(
         {"_id": id_formulir},
         {"$set": formulir_common},
         upsert=True
     )
 
-    return {**formulir_common, "_id": id_formulir}, id_formulir
-
-
-async def perbaruStatusPengembalianBarang(id_formulir):
-    pipeline = getPipeLineFormSirkulasi(id_formulir)
-    logger.debug("pipeline", pipeline)
-    logger.debug("id_formulir", id_formulir)
-    cursor = db.formulir_sirkulasi_barang.aggregate(pipeline)
-    result = await cursor.to_list(length=1)
-    result = result[0]
-
-    data_barang_sirkulasi = result["data_barang_sirkulasi"]
-    logger.debug("data_barang_sirkulasi", data_barang_sirkulasi)
-    sudahDikembalikanSemua = all(
-        barang_sirkulasi["jumlah_belum_dikembalikan"] == 0 for barang_sirkulasi in data_barang_sirkulasi
-    )
-    if sudahDikembalikanSemua:
-        db.formulir_sirkulasi_barang.update_one(
-            {"_id": ObjectId(id_formulir)},
-            {
-                "$set": { "sudah_dikembalikan_semua": True }
-            }
-        )
-    return sudahDikembalikanSemua
-    
+    return {**formulir_common, "_id": id_formulir}, id_formulir, operation
 
-async def upsertBarangSirkulasi(barang_raw, formulir, id_formulir):
+def operasiBarangSirkulasi(barang_raw, formulir, id_formulir):
     operations = []
     update_docs = []
 
@@ -214,55 +217,32 @@ async def upsertBarangSirkulasi(barang_raw, formulir, id_formulir):
             )
         })
 
-    if operations:
-        await db.barang_sirkulasi.bulk_write(operations)
-
-    return update_docs
-
-async def perbaruiJumlahBelumDikembalikanBarangSirkulasi(barang_sirkulasi_terkini, positif):
-    if not positif:
-        for barang in barang_sirkulasi_terkini:
-            barang["jumlah_dicatat"] = -barang["jumlah_dicatat"]
-
-    operations = []
-    for barang in barang_sirkulasi_terkini:
-        operations.append(
-            UpdateOne(
-                { "_id": ObjectId(barang["id_barang_sirkulasi_sebelumnya"]) },
-                { "$inc": { "jumlah_belum_dikembalikan": barang["jumlah_dicatat"] } }
-            )
-        )
-    
-    result = {}
-    if operations:
-        result = await db.barang_sirkulasi.bulk_write(operations)
-        logger.debug("berjalan")
-    
-    return result
+    return operations, update_docs
 
-async def perbaruiJumlahTerkiniBarang(formulir, barang_raw, positif, keyname):
-    barang_copy = copy.deepcopy(barang_raw)
-    if not positif:
-        for barang in barang_copy:
-            barang["jumlah_dicatat"] = -barang["jumlah_dicatat"]
+def operasiJumlahBelumDikembalikan(barang_sirkulasi, positif):
+    tanda = 1 if positif else -1
+    return [
+        UpdateOne(
+            { "_id": ObjectId(barang["id_barang_sirkulasi_sebelumnya"]) },
+            { "$inc": { "jumlah_belum_dikembalikan": tanda * barang["jumlah_dicatat"] } }
+        ) for barang in barang_sirkulasi
+        if barang.get("id_barang_sirkulasi_sebelumnya")
+    ]
 
-    operations = [
+def operasiJumlahTerkiniBarang(id_pengubah, barang_raw, positif, keyname):
+    tanda = 1 if positif else -1
+    sekarang = datetime.now(timezone.utc)
+    return [
         UpdateOne(
             {"_id": ObjectId(barang[keyname])},
             {
-                "$inc": { "jumlah_terkini": barang["jumlah_dicatat"] },
+                "$inc": { "jumlah_terkini": tanda * barang["jumlah_dicatat"] },
                 "$set": {
-                    "tanggal_diubah": datetime.now(timezone.utc),
-                    "id_pengubah":  formulir["id_pencatat"]
+                    "tanggal_diubah": sekarang,
+                    "id_pengubah": id_pengubah
                 }
             }
-        ) for barang in barang_copy]
-    result = {}
-    if operations:
-        result = await db.barang.bulk_write(operations, ordered=False)
-        logger.debug("berjalan")
-
-    return result
+        ) for barang in barang_raw]
 
 
 async def getDataBarangSirkulasiByFormulir(id_formulir: str):
@@ -273,7 +253,7 @@ async def getDataBarangSirkulasiByFormulir(id_formulir: str):
 
 async def getBarangBerisisan(barang_sirkulasi_ids):
     pipeline = get_barang_pipeline()
-    pipeline = [{ "$match": { "$expr": { "$in": ["$_id", barang_sirkulasi_ids] } } }] + pipeline
+    pipeline = [{ "$match": { "_id": { "$in": barang_sirkulasi_ids } } }] + pipeline
     cursor = db.barang.aggregate(pipeline)
     result = await cursor.to_list(length=None)
     return result
@@ -284,16 +264,50 @@ async def getBarangTidakDipinjam():
     result = await cursor.to_list(length=None)
     return result
 
-async def getDataBarangSirkulasi(id_formulir: str, is_peminjaman: bool):
-    #get data barang_sirkulasi yang id_formulirnya sama
-    barang_sirkulasi = await getDataBarangSirkulasiByFormulir(id_formulir)
-    dict_barang_sirkulasi = {str(item["id_barang"]): item for item in barang_sirkulasi}
+async def _ukurLatensi(latensi: dict, nama: str, coro):
+    mulai = time.perf_counter()
+    try:
+        return await coro
+    finally:
+        latensi[nama] = round((time.perf_counter() - mulai) * 1000, 2)
+
+async def getFormSirkulasi(id_formulir: str, is_peminjaman: bool):
+    """
+    Muat form sirkulasi dengan rencana fetch berdasarkan dependensi:
+    formulir, barang tidak dipinjam, dan rantai barang_sirkulasi -> barang berisisan
+    dijalankan bersamaan; hanya barang berisisan yang menunggu barang_sirkulasi.
+    """
+    latensi = {}
+
+    async def ambilBarangBerisisan():
+        #get data barang_sirkulasi yang id_formulirnya sama
+        barang_sirkulasi = await _ukurLatensi(latensi, "barang_sirkulasi", getDataBarangSirkulasiByFormulir(id_formulir))
+        #get data barang yang left join seperti di barang, tapi idnya dari yg tadi
+        barang_sirkulasi_ids = [item['id_barang'] for item in barang_sirkulasi]
+        barang_berisisan = await _ukurLatensi(latensi, "barang_berisisan", getBarangBerisisan(barang_sirkulasi_ids))
+        return barang_sirkulasi, barang_berisisan
+
+    async def ambilBarangTidakDipinjam():
+        if not is_peminjaman:
+            return []
+        return await _ukurLatensi(latensi, "barang_tidak_dipinjam", getBarangTidakDipinjam())
+
+    mulai = time.perf_counter()
+    informasi_sirkulasi, (barang_sirkulasi, barang_berisisan), barang_tidak_dipinjam = await asyncio.gather(
+        _ukurLatensi(latensi, "formulir", getFormulirSirkulasi(id_formulir)),
+        ambilBarangBerisisan(),
+        ambilBarangTidakDipinjam()
+    )
+    latensi["total"] = round((time.perf_counter() - mulai) * 1000, 2)
+    logger.debug("Latensi form sirkulasi %s (ms): %s", id_formulir, latensi)
 
-    #tampung deret id barang dari barang_sirkulasi
-    barang_sirkulasi_ids = [item['id_barang'] for item in barang_sirkulasi]
+    return {
+        "informasi_sirkulasi": informasi_sirkulasi,
+        "pilihan_barang": getDataBarangSirkulasi(barang_sirkulasi, barang_berisisan, barang_tidak_dipinjam, is_peminjaman)
+    }
 
-    #get data barang yang left join seperti di barang, tapi idnya dari yg tadi
-    barang_berisisan = await getBarangBerisisan(barang_sirkulasi_ids)
+def getDataBarangSirkulasi(barang_sirkulasi: list, barang_berisisan: list, barang_tidak_dipinjam: list, is_peminjaman: bool):
+    dict_barang_sirkulasi = {str(item["id_barang"]): item for item in barang_sirkulasi}
 
     #lenkapi data
     def setDataBarang(list_barang):
@@ -315,7 +329,6 @@ async def getDataBarangSirkulasi(id_formulir: str, is_peminjaman: bool):
 
     #untuk peminjaman, concat juga data tidak dipinjam
     if is_peminjaman:
-        barang_tidak_dipinjam = await getBarangTidakDipinjam()
         for item in barang_tidak_dipinjam:
             item["jumlah_maks_dapat_dicatat"] = item["jumlah_terkini"]
             item["jumlah_dicatat"] = item["jumlah_terkini"]
@@ -338,130 +351,200 @@ async def getFormulirSirkulasi(id_formulir):
     result = await cursor.to_list(length=1)
     return result[0]
 
-async def kembalikanJumlahTerkiniBarang(formulir):
-    cursor_barang_sirkulasi = db.barang_sirkulasi.aggregate([{"$match": { "id_formulir": formulir["_id"]}}])
-    barang_sirkulasi = await cursor_barang_sirkulasi.to_list(length=None)
-    result = await perbaruiJumlahTerkiniBarang(formulir, barang_sirkulasi, formulir["status_sirkulasi"] == "peminjaman", "id_barang")
-    return result.modified_count if result.modified_count else 0
-
-async def hapusBarangSirkulasi(id_formulir: ObjectId):
-    result = await db.barang_sirkulasi.delete_many({"id_formulir": id_formulir})
-    return result.deleted_count if result.deleted_count else 0
+# -----------------------------
+# Engine tulis sirkulasi
+# -----------------------------
+# Setiap operasi (post/patch/delete) dipecah menjadi dua langkah:
+# 1. rencanakan*: baca data yang dibutuhkan (dalam session transaksi) lalu susun
+#    semua mutasi sebagai operasi bulk per koleksi, tanpa menulis apapun;
+# 2. jalankanTransaksiSirkulasi: eksekusi rencana dalam satu transaksi
+#    multi-dokumen, maksimal satu bulk_write per koleksi.
+# Transaksi butuh replica set (single-node replica set lokal sudah cukup).
+KOLEKSI_SIRKULASI = ["formulir_sirkulasi_barang", "barang_sirkulasi", "barang"]
+
+def rencanaKosong():
+    return {collection_name: [] for collection_name in KOLEKSI_SIRKULASI}
+
+async def jalankanTransaksiSirkulasi(rencanakan):
+    """
+    `rencanakan(session)` mengembalikan (rencana, hasil). with_transaction
+    mengulang seluruh callback (termasuk pembacaan) saat TransientTransactionError
+    dan mengulang commit saat UnknownTransactionCommitResult.
+    """
+    if get_transaksi_didukung() is False:
+        raise HTTPException(status_code=503, detail="Penulisan sirkulasi butuh MongoDB replica set (transaksi tidak tersedia)")
+
+    async def callback(session):
+        rencana, hasil = await rencanakan(session)
+        for collection_name in KOLEKSI_SIRKULASI:
+            operations = rencana[collection_name]
+            if operations:
+                await db[collection_name].bulk_write(operations, ordered=True, session=session)
+        return hasil
+
+    async with await get_client().start_session() as session:
+        return await session.with_transaction(
+            callback,
+            read_concern=ReadConcern("snapshot"),
+            write_concern=WriteConcern("majority")
+        )
 
-async def hapusFormulirSirkulasi(id_formulir: ObjectId):
-    result = await db.formulir_sirkulasi_barang.delete_one({"_id": id_formulir})
-    return result.deleted_count if result.deleted_count else 0
+async def rencanakanPostSirkulasi(body, object_user_id, session):
+    rencana = rencanaKosong()
+    formulir, formulir_id, operasi_formulir = siapkanFormulirSirkulasi(body["penanggung_jawab"], object_user_id, True)
+    rencana["formulir_sirkulasi_barang"].append(operasi_formulir)
 
-async def perbaruiStatusDikembalikanFormulirSirkulasi(id_formulir: ObjectId):
-    result = await db.formulir_sirkulasi_barang.update_one(
-        {"_id": id_formulir},
-        {
-            "$set": { "sudah_dikembalikan_semua": False }
-        }
+    barang_raw = body["barang"]
+    operasi_barang_sirkulasi, barang_dicatat = operasiBarangSirkulasi(barang_raw, formulir, formulir_id)
+    rencana["barang_sirkulasi"].extend(operasi_barang_sirkulasi)
+    rencana["barang"].extend(
+        operasiJumlahTerkiniBarang(formulir["id_pencatat"], barang_raw, formulir["status_sirkulasi"] != "peminjaman", "id")
     )
-    return result.modified_count if result.modified_count else 0
-
-async def kembalikanJumlahBarangSirkulasi(id_formulir: ObjectId):
-    cursor_barang_sirkulasi_pengembalian = db.barang_sirkulasi.aggregate([{"$match":{"id_formulir": id_formulir}}])
-    barang_sirkulasi_pengembalian = await cursor_barang_sirkulasi_pengembalian.to_list(length=None)
-    result = await perbaruiJumlahBelumDikembalikanBarangSirkulasi(barang_sirkulasi_pengembalian, True)
-    return result.modified_count if result.modified_count else 0
-
-async def perbaruiDanSinkronisasiBarang(formulir, body):
-    operations_barang_sirkulasi = []
-    operations_barang = []
-
-    # Data baru dari request
-    data_barang_sirkulasi_baru = body["barang"]
-    dict_barang_sirkulasi_baru = {str(item["id"]): item for item in data_barang_sirkulasi_baru}
-    logger.debug("Barang sirkulasi baru:", dict_barang_sirkulasi_baru)
-
-    # Data lama dari database
-    data_barang_sirkulasi_lama = await getDataBarangSirkulasiByFormulir(str(formulir["_id"]))
-    dict_barang_sirkulasi_lama = {str(item["_id"]): item for item in data_barang_sirkulasi_lama}
-    logger.debug("Barang sirkulasi lama:", dict_barang_sirkulasi_lama)
-
-    # Tangani barang yang baru (insert atau update)
-    for id_baru, barang_baru in dict_barang_sirkulasi_baru.items():
-        if id_baru in dict_barang_sirkulasi_lama:
-            barang_lama = dict_barang_sirkulasi_lama[id_baru]
-            selisih = barang_lama["jumlah_dicatat"] - barang_baru["jumlah_dicatat"]
-            logger.debug(f"Update: ID {id_baru}, selisih: {selisih}")
-            if selisih != 0:
-                operations_barang.append(
-                    UpdateOne(
-                        { "_id": ObjectId(barang_baru["id"]) },
-                        { "$inc": { "jumlah_terkini": selisih } }
-                    )
-                )
-                # (Opsional) update keterangan/jumlah di koleksi barang_sirkulasi jika dibutuhkan
-                operations_barang_sirkulasi.append(
-                    UpdateOne(
-                        { "_id": ObjectId(id_baru) },
-                        { "$set": {
-                            "jumlah_dicatat": barang_baru["jumlah_dicatat"],
-                            "keterangan": barang_baru.get("keterangan", "")
-                        }}
-                    )
-                )
-        else:
-            # Data baru → insert barang_sirkulasi dan update jumlah_terkini
-            logger.debug(f"Insert baru: ID {id_baru}")
-            operations_barang_sirkulasi.append(
-                InsertOne({
-                    "id_formulir": ObjectId(formulir["_id"]),
-                    "id_barang": ObjectId(barang_baru["id"]),
-                    "jumlah_dicatat": barang_baru["jumlah_dicatat"],
-                    "status_sirkulasi": formulir["status_sirkulasi"],
-                    "keterangan": barang_baru.get("keterangan", "")
-                })
-            )
-            operations_barang.append(
-                UpdateOne(
-                    { "_id": ObjectId(barang_baru["id"]) },
-                    { "$inc": { "jumlah_terkini": -barang_baru["jumlah_dicatat"] } }
-                )
-            )
 
-    # Tangani barang yang dihapus dari form
-    for id_lama, barang_lama in dict_barang_sirkulasi_lama.items():
-        if id_lama not in dict_barang_sirkulasi_baru:
-            logger.debug(f"Delete: ID {id_lama}")
-            operations_barang_sirkulasi.append(
-                DeleteOne({ "_id": ObjectId(id_lama) })
-            )
-            operations_barang.append(
-                UpdateOne(
-                    { "_id": ObjectId(barang_lama["id_barang"]) },
-                    { "$inc": { "jumlah_terkini": barang_lama["jumlah_dicatat"] } }
-                )
-            )
-
-    # Log operasi sebelum eksekusi
-    logger.debug("Operasi barang_sirkulasi:", operations_barang_sirkulasi)
-    logger.debug("Operasi barang:", operations_barang)
-
-    # Eksekusi bulk
-    if operations_barang_sirkulasi:
-        await db.barang_sirkulasi.bulk_write(operations_barang_sirkulasi)
-    if operations_barang:
-        await db.barang.bulk_write(operations_barang)
+    if formulir["status_sirkulasi"] == "pengembalian":
+        rencana["barang_sirkulasi"].extend(operasiJumlahBelumDikembalikan(barang_dicatat, False))
+
+        # Cek apakah formulir peminjaman sebelumnya sudah dikembalikan semua
+        # setelah pengembalian ini diterapkan
+        id_formulir_sebelumnya = formulir["id_formulir_sebelumnya"]
+        dikembalikan = {}
+        for barang in barang_dicatat:
+            if barang.get("id_barang_sirkulasi_sebelumnya"):
+                id_sebelumnya = ObjectId(barang["id_barang_sirkulasi_sebelumnya"])
+                dikembalikan[id_sebelumnya] = dikembalikan.get(id_sebelumnya, 0) + barang["jumlah_dicatat"]
+
+        barang_sirkulasi_sebelumnya = await db.barang_sirkulasi.find(
+            {"id_formulir": id_formulir_sebelumnya},
+            {"jumlah_belum_dikembalikan": 1},
+            session=session
+        ).to_list(length=None)
+        sudah_dikembalikan_semua = all(
+            barang.get("jumlah_belum_dikembalikan", 0) - dikembalikan.get(barang["_id"], 0) == 0
+            for barang in barang_sirkulasi_sebelumnya
+        )
+        if sudah_dikembalikan_semua:
+            rencana["formulir_sirkulasi_barang"].append(UpdateOne(
+                {"_id": id_formulir_sebelumnya},
+                {"$set": { "sudah_dikembalikan_semua": True }}
+            ))
+
+    return rencana, {
+        "formulir_id": formulir_id,
+        "jumlah_barang_dicatat": len(barang_dicatat),
+        "jumlah_barang_diupdate": len(rencana["barang"])
+    }
 
-    return {
-        "barang_sirkulasi": {
-            "inserted": sum(1 for op in operations_barang_sirkulasi if isinstance(op, InsertOne)),
-            "updated": sum(1 for op in operations_barang_sirkulasi if isinstance(op, UpdateOne)),
-            "deleted": sum(1 for op in operations_barang_sirkulasi if isinstance(op, DeleteOne)),
-        },
-        "barang": {
-            "updated": len(operations_barang)
+async def rencanakanPatchSirkulasi(body, object_user_id, session):
+    rencana = rencanaKosong()
+    formulir, formulir_id, operasi_formulir = siapkanFormulirSirkulasi(body["penanggung_jawab"], object_user_id, False)
+    rencana["formulir_sirkulasi_barang"].append(operasi_formulir)
+
+    # Data lama dari database, dicocokkan per id_barang
+    data_barang_sirkulasi_lama = await db.barang_sirkulasi.find(
+        {"id_formulir": formulir_id},
+        session=session
+    ).to_list(length=None)
+    dict_barang_sirkulasi_lama = {str(item["id_barang"]): item for item in data_barang_sirkulasi_lama}
+
+    barang_raw = body["barang"]
+    dict_barang_sirkulasi_baru = {str(item["id"]): item for item in barang_raw}
+    ringkasan = {"inserted": 0, "updated": 0, "deleted": 0}
+
+    # Barang baru/diubah: selisih jumlah dikembalikan ke jumlah_terkini barang
+    for id_barang, barang_baru in dict_barang_sirkulasi_baru.items():
+        barang_lama = dict_barang_sirkulasi_lama.get(id_barang)
+        jumlah_lama = barang_lama["jumlah_dicatat"] if barang_lama else 0
+        selisih = jumlah_lama - barang_baru.get("jumlah_dicatat", 0)
+        if barang_lama is None:
+            ringkasan["inserted"] += 1
+        elif selisih != 0:
+            ringkasan["updated"] += 1
+        if selisih != 0:
+            rencana["barang"].append(UpdateOne(
+                { "_id": ObjectId(id_barang) },
+                { "$inc": { "jumlah_terkini": selisih } }
+            ))
+    operasi_barang_sirkulasi, barang_dicatat = operasiBarangSirkulasi(barang_raw, formulir, formulir_id)
+    rencana["barang_sirkulasi"].extend(operasi_barang_sirkulasi)
+
+    # Barang yang dihapus dari form
+    for id_barang, barang_lama in dict_barang_sirkulasi_lama.items():
+        if id_barang not in dict_barang_sirkulasi_baru:
+            ringkasan["deleted"] += 1
+            rencana["barang_sirkulasi"].append(DeleteOne({ "_id": barang_lama["_id"] }))
+            rencana["barang"].append(UpdateOne(
+                { "_id": barang_lama["id_barang"] },
+                { "$inc": { "jumlah_terkini": barang_lama["jumlah_dicatat"] } }
+            ))
+
+    logger.debug("Rencana patch sirkulasi %s: %s", formulir_id, ringkasan)
+    return rencana, {
+        "formulir_id": formulir_id,
+        "jumlah_barang_dicatat": len(barang_dicatat),
+        "update_bingung_hehe": {
+            "barang_sirkulasi": ringkasan,
+            "barang": {
+                "updated": len(rencana["barang"])
+            }
         }
     }
 
+async def rencanakanDeleteSirkulasi(id_formulir: str, session):
+    rencana = rencanaKosong()
+    formulir = await db.formulir_sirkulasi_barang.find_one({"_id": ObjectId(id_formulir)}, session=session)
+    if not formulir:
+        raise HTTPException(status_code=404, detail="Formulir sirkulasi tidak ditemukan")
+
+    barang_sirkulasi = await db.barang_sirkulasi.find(
+        {"id_formulir": formulir["_id"]},
+        session=session
+    ).to_list(length=None)
+
+    # peminjaman dihapus -> barang kembali tersedia, pengembalian dihapus -> sebaliknya
+    rencana["barang"].extend(operasiJumlahTerkiniBarang(
+        formulir.get("id_pencatat"), barang_sirkulasi, formulir["status_sirkulasi"] == "peminjaman", "id_barang"
+    ))
+    if formulir["status_sirkulasi"] != "peminjaman":
+        rencana["formulir_sirkulasi_barang"].append(UpdateOne(
+            {"_id": formulir["id_formulir_sebelumnya"]},
+            {"$set": { "sudah_dikembalikan_semua": False }}
+        ))
+        rencana["barang_sirkulasi"].extend(operasiJumlahBelumDikembalikan(barang_sirkulasi, True))
+
+    rencana["barang_sirkulasi"].append(DeleteMany({"id_formulir": formulir["_id"]}))
+    rencana["formulir_sirkulasi_barang"].append(DeleteOne({"_id": formulir["_id"]}))
+
+    return rencana, {
+        "jumlah_barang_diganti": len(rencana["barang"]),
+        "jumlah_barang_sirkulasi_dihapus": len(barang_sirkulasi)
+    }
+
 async def getListSirkulasi():
     pipeline = getPipeLineFormSirkulasi()
     cursor = db.formulir_sirkulasi_barang.aggregate(pipeline)
     result = await cursor.to_list(length=None)
+    return await lengkapiPencatat(result)
+
+async def getHalamanSirkulasi(limit: int, after: Optional[str] = None, dengan_total: bool = False):
+    pipeline = getPipeLineFormSirkulasi(limit=limit, after=after)
+    cursor = db.formulir_sirkulasi_barang.aggregate(pipeline)
+    result = keyset_page(await cursor.to_list(length=None), SORT_SIRKULASI, limit)
+    await lengkapiPencatat(result["data"])
+    if dengan_total:
+        result["total"] = await db.formulir_sirkulasi_barang.count_documents({})
+    return result
+
+async def getHalamanBarang(
+    status: Literal["semua", "dipinjam", "tidak_dipinjam"],
+    limit: int,
+    after: Optional[str] = None,
+    dengan_total: bool = False
+):
+    pipeline = get_barang_pipeline(status, limit, after)
+    cursor = db.barang_aktif.aggregate(pipeline)
+    result = keyset_page(await cursor.to_list(length=None), SORT_BARANG, limit)
+    if dengan_total:
+        result["total"] = await db.barang_aktif.count_documents(get_barang_filter(status))
     return result
 
 
@@ -481,20 +564,37 @@ async def sync_barang_hirarki(parentId: ObjectId, barang_hirarki_baru: list):
 
 
     bulk_ops = []
+    # Denormalisasi hirarki di dokumen barang
+    barang_ops = [
+        UpdateOne(
+            {"_id": parentId},
+            {"$set": {"children_ids": [ObjectId(child["id"]) for child in barang_hirarki_baru]}}
+        )
+    ]
 
     # Siapkan operasi insert
     for parent, child in to_insert:
         bulk_ops.append(InsertOne({
-            "parent_id": ObjectId(parent),
-            "child_id": ObjectId(child)
+            "parentId": ObjectId(parent),
+            "childId": ObjectId(child)
         }))
+        barang_ops.append(UpdateOne(
+            {"_id": ObjectId(child)},
+            {"$set": {"parent_id": ObjectId(parent)}}
+        ))
 
     # Siapkan operasi delete
     for parent, child in to_delete:
         bulk_ops.append(DeleteOne({
-            "parent_id": ObjectId(parent),
-            "child_id": ObjectId(child)
+            "parentId": ObjectId(parent),
+            "childId": ObjectId(child)
         }))
+        barang_ops.append(UpdateOne(
+            {"_id": ObjectId(child), "parent_id": ObjectId(parent)},
+            {"$set": {"parent_id": None}}
+        ))
+
+    await db.barang.bulk_write(barang_ops, ordered=False)
 
     # Eksekusi bulk jika ada operasi
     if bulk_ops:
@@ -508,3 +608,62 @@ async def sync_barang_hirarki(parentId: ObjectId, barang_hirarki_baru: list):
         "inserted_count": 0,
         "deleted_count": 0
     }
+
+def set_hirarki_barang(flatten_data: list, relation_data: list):
+    """Isi parent_id dan children_ids pada barang baru dari relasi hasil flatten."""
+    parent_map = {}
+    children_map = {}
+    for relasi in relation_data:
+        parent_map[relasi["childId"]] = relasi["parentId"]
+        children_map.setdefault(relasi["parentId"], []).append(relasi["childId"])
+
+    for data in flatten_data:
+        data["parent_id"] = parent_map.get(data["_id"])
+        data["children_ids"] = children_map.get(data["_id"], [])
+    return flatten_data
+
+async def backfill_barang_hirarki():
+    """
+    Isi ulang parent_id/children_ids di semua barang dari koleksi barang_hirarki.
+    Relasi lama yang tersimpan sebagai parent_id/child_id ikut dinormalisasi.
+    """
+    relasi = await db.barang_hirarki.find({}).to_list(length=None)
+
+    hirarki_ops = []
+    parent_map = {}
+    children_map = {}
+    for rel in relasi:
+        parent = rel.get("parentId", rel.get("parent_id"))
+        child = rel.get("childId", rel.get("child_id"))
+        if parent is None or child is None:
+            continue
+        if "parentId" not in rel or "childId" not in rel:
+            hirarki_ops.append(UpdateOne(
+                {"_id": rel["_id"]},
+                {
+                    "$set": {"parentId": parent, "childId": child},
+                    "$unset": {"parent_id": "", "child_id": ""}
+                }
+            ))
+        parent_map[child] = parent
+        children_map.setdefault(parent, []).append(child)
+
+    barang_ops = [UpdateMany({}, {"$set": {"parent_id": None, "children_ids": []}})]
+    barang_ops += [
+        UpdateOne({"_id": parent}, {"$set": {"children_ids": children}})
+        for parent, children in children_map.items()
+    ]
+    barang_ops += [
+        UpdateOne({"_id": child}, {"$set": {"parent_id": parent}})
+        for child, parent in parent_map.items()
+    ]
+
+    if hirarki_ops:
+        await db.barang_hirarki.bulk_write(hirarki_ops, ordered=False)
+    # ordered=True: reset semua barang dulu sebelum relasi diisi
+    result = await db.barang.bulk_write(barang_ops, ordered=True)
+    return {
+        "relasi": len(parent_map),
+        "relasi_dinormalisasi": len(hirarki_ops),
+        "barang_diperbarui": result.modified_count
+    }
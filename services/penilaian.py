@@ -0,0 +1,145 @@
+import csv
+import io
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+import pandas as pd
+from utils.database import db
+from services.rekap_nilai import perbaruiRekapNilai
+
+# Kolom berkas import nilai (format panjang, satu baris per aspek)
+KOLOM_BERKAS_NILAI = ["jenis", "id_kelompok", "id_mahasiswa", "aspek_penilaian_id", "nilai"]
+
+# jenis -> (koleksi, field kunci selain id_penilai)
+KOLEKSI_NILAI = {
+    "kelompok": ("nilai_kelompok", "id_kelompok"),
+    "perorangan": ("nilai_perorangan", "id_mahasiswa"),
+}
+
+def _objectIdWajib(value, field: str) -> ObjectId:
+    # ObjectId(None) membuat id acak baru, jadi None/tipe lain ditolak eksplisit
+    if isinstance(value, ObjectId):
+        return value
+    if isinstance(value, str) and ObjectId.is_valid(value):
+        return ObjectId(value)
+    raise ValueError(f"'{field}' bukan ObjectId yang valid: {value!r}")
+
+def siapkanEntriNilai(jenis: str, entri: dict, id_penilai: ObjectId) -> dict:
+    """Validasi satu set nilai dan konversi id-nya ke ObjectId. Raise ValueError jika tidak valid."""
+    wajib = ["id_kelompok", "nilai"] + (["id_mahasiswa"] if jenis == "perorangan" else [])
+    kurang = [field for field in wajib if field not in entri]
+    if kurang:
+        raise ValueError(f"Field wajib tidak ada: {', '.join(kurang)}")
+    if not isinstance(entri["nilai"], list):
+        raise ValueError("'nilai' harus berupa array")
+
+    try:
+        doc = {k: v for k, v in entri.items() if k != "baris"}
+        doc["id_kelompok"] = _objectIdWajib(entri["id_kelompok"], "id_kelompok")
+        if jenis == "perorangan":
+            doc["id_mahasiswa"] = _objectIdWajib(entri["id_mahasiswa"], "id_mahasiswa")
+        doc["nilai"] = [
+            {**nilai, "aspek_penilaian_id": _objectIdWajib(nilai["aspek_penilaian_id"], "aspek_penilaian_id")}
+            for nilai in entri["nilai"]
+        ]
+    except (InvalidId, TypeError) as e:
+        raise ValueError(f"ObjectId tidak valid: {e}")
+    except KeyError as e:
+        raise ValueError(f"Item nilai tanpa field {e}")
+
+    doc["id_penilai"] = id_penilai
+    return doc
+
+async def simpanNilaiMassal(id_penilai: ObjectId, nilai_kelompok: list, nilai_perorangan: list):
+    """
+    Simpan banyak set nilai sekaligus: satu bulk_write unordered berisi upsert
+    per koleksi, lalu rekap_nilai diperbarui untuk subjek yang berhasil.
+    Setiap entri boleh membawa "baris" (nomor baris asal) untuk laporan error.
+    """
+    hasil = {"errors": []}
+
+    for jenis, daftar_entri in (("kelompok", nilai_kelompok), ("perorangan", nilai_perorangan)):
+        collection_name, field_kunci = KOLEKSI_NILAI[jenis]
+        operations = []
+        entri_valid = []
+        for indeks, entri in enumerate(daftar_entri):
+            baris = entri.get("baris", indeks) if isinstance(entri, dict) else indeks
+            try:
+                if not isinstance(entri, dict):
+                    raise ValueError("Setiap entri harus berupa object")
+                doc = siapkanEntriNilai(jenis, entri, id_penilai)
+            except ValueError as e:
+                hasil["errors"].append({"jenis": jenis, "baris": baris, "error": str(e)})
+                continue
+
+            operations.append(UpdateOne(
+                {field_kunci: doc[field_kunci], "id_penilai": id_penilai},
+                {"$set": doc},
+                upsert=True
+            ))
+            entri_valid.append((baris, doc[field_kunci]))
+
+        ringkasan = {"upserted": 0, "modified": 0}
+        gagal = set()
+        if operations:
+            try:
+                result = await db[collection_name].bulk_write(operations, ordered=False)
+                ringkasan = {"upserted": result.upserted_count, "modified": result.modified_count}
+            except BulkWriteError as e:
+                details = e.details
+                ringkasan = {"upserted": details.get("nUpserted", 0), "modified": details.get("nModified", 0)}
+                for write_error in details.get("writeErrors", []):
+                    gagal.add(write_error["index"])
+                    hasil["errors"].append({
+                        "jenis": jenis,
+                        "baris": entri_valid[write_error["index"]][0],
+                        "error": write_error.get("errmsg", "Gagal menyimpan")
+                    })
+
+        id_subjek_berhasil = [id_subjek for i, (_, id_subjek) in enumerate(entri_valid) if i not in gagal]
+        await perbaruiRekapNilai(jenis, id_subjek_berhasil, id_penilai)
+        hasil[jenis] = ringkasan
+
+    return hasil
+
+def bacaBerkasNilai(nama_berkas: str, isi: bytes):
+    """
+    Baca berkas CSV/XLSX format panjang (lihat KOLOM_BERKAS_NILAI) dan
+    kelompokkan menjadi set nilai per (jenis, kelompok, mahasiswa).
+    Mengembalikan (nilai_kelompok, nilai_perorangan, errors).
+    """
+    if nama_berkas.lower().endswith(".xlsx"):
+        df = pd.read_excel(io.BytesIO(isi), dtype=str).fillna("")
+        rows = df.to_dict(orient="records")
+    else:
+        rows = list(csv.DictReader(io.StringIO(isi.decode("utf-8-sig"))))
+
+    errors = []
+    if rows and any(kolom not in rows[0] for kolom in KOLOM_BERKAS_NILAI):
+        errors.append({"baris": 1, "error": f"Kolom wajib: {', '.join(KOLOM_BERKAS_NILAI)}"})
+        return [], [], errors
+
+    set_nilai = {}
+    for nomor, row in enumerate(rows, start=2):  # baris 1 adalah header
+        row = {k: str(v).strip() for k, v in row.items() if k is not None}
+        jenis = row["jenis"].lower()
+        if jenis not in KOLEKSI_NILAI:
+            errors.append({"baris": nomor, "error": f"Jenis tidak dikenal: '{row['jenis']}'"})
+            continue
+        try:
+            nilai = float(row["nilai"])
+        except ValueError:
+            errors.append({"jenis": jenis, "baris": nomor, "error": f"Nilai bukan angka: '{row['nilai']}'"})
+            continue
+
+        kunci = (jenis, row["id_kelompok"], row["id_mahasiswa"] if jenis == "perorangan" else "")
+        if kunci not in set_nilai:
+            set_nilai[kunci] = {"baris": nomor, "id_kelompok": row["id_kelompok"], "nilai": []}
+            if jenis == "perorangan":
+                set_nilai[kunci]["id_mahasiswa"] = row["id_mahasiswa"]
+        set_nilai[kunci]["nilai"].append({"aspek_penilaian_id": row["aspek_penilaian_id"], "nilai": nilai})
+
+    nilai_kelompok = [entri for (jenis, _, _), entri in set_nilai.items() if jenis == "kelompok"]
+    nilai_perorangan = [entri for (jenis, _, _), entri in set_nilai.items() if jenis == "perorangan"]
+    return nilai_kelompok, nilai_perorangan, errors
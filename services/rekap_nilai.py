@@ -0,0 +1,329 @@
+import numpy as np
+from bson import ObjectId
+from datetime import datetime, timezone
+from pymongo import UpdateOne, DeleteMany
+from utils.database import db, convert_objectid
+from services.tugas_besar import getNilaiPerKelompok, getAspekPenilaianPerorangan, extract_children_only, pipelineSkorPanelis
+
+def hitungSkorPerorangan(mahasiswa_ids: list, doc_nilai: list, doc_aspek: list):
+    """
+    Hitung nilai perorangan (rata-rata skor berbobot semua panelis) untuk
+    setiap mahasiswa secara vektor: susun array mahasiswa x panelis x aspek,
+    kalikan dengan vektor bobot, lalu rata-ratakan per mahasiswa.
+    Mengembalikan array dengan urutan yang sama dengan `mahasiswa_ids`.
+    """
+    idx_mahasiswa = {str(id_mahasiswa): i for i, id_mahasiswa in enumerate(mahasiswa_ids)}
+    idx_aspek = {str(aspek["id"]): i for i, aspek in enumerate(doc_aspek)}
+    idx_panelis = {}
+    for doc in doc_nilai:
+        idx_panelis.setdefault(str(doc.get("id_penilai")), len(idx_panelis))
+
+    bobot = np.array([aspek.get("bobot", 0) for aspek in doc_aspek], dtype=float)
+    ada_nilai = np.zeros((len(mahasiswa_ids), len(idx_panelis)), dtype=bool)
+
+    # indeks datar (mahasiswa, panelis, aspek) untuk semua item nilai
+    m_idx, p_idx, a_idx, nilai = [], [], [], []
+    for doc in doc_nilai:
+        m = idx_mahasiswa.get(str(doc["id_mahasiswa"]))
+        if m is None:
+            continue
+        p = idx_panelis[str(doc.get("id_penilai"))]
+        ada_nilai[m, p] = True
+        for item in doc.get("nilai", []):
+            a = idx_aspek.get(str(item["aspek_penilaian_id"]))
+            if a is None:
+                continue
+            m_idx.append(m)
+            p_idx.append(p)
+            a_idx.append(a)
+            nilai.append(item["nilai"])
+
+    skor = np.zeros((len(mahasiswa_ids), len(idx_panelis), len(doc_aspek)))
+    indeks = tuple(np.asarray(idx, dtype=np.intp) for idx in (m_idx, p_idx, a_idx))
+    np.add.at(skor, indeks, np.asarray(nilai, dtype=float))
+
+    skor_panelis = skor @ bobot / 100
+    jumlah_panelis = ada_nilai.sum(axis=1)
+    total = (skor_panelis * ada_nilai).sum(axis=1)
+    return np.where(jumlah_panelis > 0, total / np.maximum(jumlah_panelis, 1), 0.0)
+
+async def hitungRekapNilaiPerorangan(tahun, kelas):
+    doc_kelompok_tubes = await getNilaiPerKelompok(tahun, kelas)
+    doc_aspek_penilaian_perorangan = await getAspekPenilaianPerorangan(tahun)
+    doc_aspek_penilaian_perorangan = extract_children_only(doc_aspek_penilaian_perorangan)
+
+    # satu baris rekap untuk setiap pasangan (kelompok, anggota)
+    baris = [
+        (kelompok, anggota)
+        for kelompok in doc_kelompok_tubes
+        for anggota in kelompok.get("anggota", [])
+    ]
+    if not baris:
+        return []
+
+    mahasiswa_ids = list(dict.fromkeys(ObjectId(anggota["id"]) for _, anggota in baris))
+    doc_nilai_perorangan = await db.nilai_perorangan.find(
+        {"id_mahasiswa": {"$in": mahasiswa_ids}},
+        {"id_mahasiswa": 1, "id_penilai": 1, "nilai": 1}
+    ).to_list(length=None)
+
+    skor_mahasiswa = hitungSkorPerorangan(mahasiswa_ids, doc_nilai_perorangan, doc_aspek_penilaian_perorangan)
+
+    idx_mahasiswa = {str(id_mahasiswa): i for i, id_mahasiswa in enumerate(mahasiswa_ids)}
+    nilai_perorangan = skor_mahasiswa[[idx_mahasiswa[anggota["id"]] for _, anggota in baris]]
+    nilai_kelompok = np.array([kelompok.get("nilaiAkhir", 0) for kelompok, _ in baris], dtype=float)
+    nilai_akhir = (nilai_perorangan + nilai_kelompok) / 2
+
+    return [
+        {
+            "nama": anggota["nama"],
+            "nim": anggota["nim"],
+            "kelas": kelompok["kelas"],
+            "tahun": kelompok["tahun"],
+            "nomor": kelompok["nomor"],
+            "nilaiPerorangan": float(nilai_perorangan[i]),
+            "nilaiKelompok": float(nilai_kelompok[i]),
+            "nilaiAkhir": float(nilai_akhir[i])
+        }
+        for i, (kelompok, anggota) in enumerate(baris)
+    ]
+
+# -----------------------------
+# Rekap nilai termaterialisasi
+# -----------------------------
+# Koleksi rekap_nilai menyimpan satu dokumen per kelompok/mahasiswa:
+# { jenis, id_subjek, panelis: [{ id_penilai, skor }], nilai, diperbarui }
+# `nilai` adalah rata-rata skor berbobot semua panelis.
+JENIS_REKAP = {
+    "kelompok": {
+        "koleksi_nilai": "nilai_kelompok",
+        "koleksi_aspek": "aspek_penilaian_kelompok",
+        "field_subjek": "id_kelompok",
+    },
+    "perorangan": {
+        "koleksi_nilai": "nilai_perorangan",
+        "koleksi_aspek": "aspek_penilaian_perorangan",
+        "field_subjek": "id_mahasiswa",
+    },
+}
+
+def jenisRekapDariKoleksiAspek(collection_name: str):
+    return next((jenis for jenis, cfg in JENIS_REKAP.items() if cfg["koleksi_aspek"] == collection_name), None)
+
+async def perbaruiRekapNilai(jenis: str, id_subjek_list: list, id_penilai: ObjectId):
+    """
+    Perbarui rekap secara inkremental setelah satu panelis menyimpan nilai:
+    hanya skor panelis tersebut yang dihitung ulang, lalu rata-rata
+    dihitung dari skor panelis yang sudah tersimpan di dokumen rekap.
+    """
+    if not id_subjek_list:
+        return 0
+
+    cfg = JENIS_REKAP[jenis]
+    cursor = db[cfg["koleksi_nilai"]].aggregate([
+        {"$match": {
+            cfg["field_subjek"]: {"$in": id_subjek_list},
+            "id_penilai": id_penilai
+        }},
+        *pipelineSkorPanelis(cfg["koleksi_aspek"], cfg["field_subjek"])
+    ])
+    skor_panelis = await cursor.to_list(length=None)
+
+    operations = [
+        UpdateOne(
+            {"jenis": jenis, "id_subjek": doc["id_subjek"]},
+            [
+                {"$set": {"panelis": {"$concatArrays": [
+                    {"$filter": {
+                        "input": {"$ifNull": ["$panelis", []]},
+                        "cond": {"$ne": ["$$this.id_penilai", id_penilai]}
+                    }},
+                    [{"id_penilai": id_penilai, "skor": doc["skor"]}]
+                ]}}},
+                {"$set": {"nilai": {"$avg": "$panelis.skor"}, "diperbarui": "$$NOW"}}
+            ],
+            upsert=True
+        )
+        for doc in skor_panelis
+    ]
+    if operations:
+        await db.rekap_nilai.bulk_write(operations, ordered=False)
+    return len(operations)
+
+async def hitungUlangRekapTahun(jenis: str, tahun: int):
+    """Hitung ulang seluruh rekap satu jenis untuk semua kelompok pada tahun tertentu."""
+    cfg = JENIS_REKAP[jenis]
+    doc_kelompok = await db.kelompok_tubes.find({"tahun": tahun}, {"id_anggota": 1}).to_list(length=None)
+    if jenis == "kelompok":
+        id_subjek_list = [kelompok["_id"] for kelompok in doc_kelompok]
+    else:
+        id_subjek_list = list(dict.fromkeys(
+            id_anggota for kelompok in doc_kelompok for id_anggota in kelompok.get("id_anggota", [])
+        ))
+    if not id_subjek_list:
+        return 0
+
+    cursor = db[cfg["koleksi_nilai"]].aggregate([
+        {"$match": {cfg["field_subjek"]: {"$in": id_subjek_list}}},
+        *pipelineSkorPanelis(cfg["koleksi_aspek"], cfg["field_subjek"]),
+        {"$group": {
+            "_id": "$id_subjek",
+            "panelis": {"$push": {"id_penilai": "$id_penilai", "skor": "$skor"}},
+            "nilai": {"$avg": "$skor"}
+        }}
+    ])
+    doc_rekap = await cursor.to_list(length=None)
+
+    sekarang = datetime.now(timezone.utc)
+    operations = [
+        UpdateOne(
+            {"jenis": jenis, "id_subjek": doc["_id"]},
+            {"$set": {"panelis": doc["panelis"], "nilai": doc["nilai"], "diperbarui": sekarang}},
+            upsert=True
+        )
+        for doc in doc_rekap
+    ]
+    # subjek yang belum punya nilai sama sekali tidak perlu dokumen rekap
+    subjek_dinilai = set(doc["_id"] for doc in doc_rekap)
+    subjek_kosong = [id_subjek for id_subjek in id_subjek_list if id_subjek not in subjek_dinilai]
+    if subjek_kosong:
+        operations.append(DeleteMany({"jenis": jenis, "id_subjek": {"$in": subjek_kosong}}))
+
+    if operations:
+        await db.rekap_nilai.bulk_write(operations, ordered=False)
+    return len(doc_rekap)
+
+async def isiRekapNilaiJikaKosong():
+    """
+    Dipanggil saat startup: deployment lama punya nilai tapi rekap_nilai masih
+    kosong, dan pembacaan rekap akan menampilkan 0 untuk semua nilai. Hitung
+    semua tahun sekali; upsert idempoten, jadi aman jika beberapa worker
+    menjalankannya bersamaan.
+    """
+    if await db.rekap_nilai.find_one({}, {"_id": 1}):
+        return []
+    if not (await db.nilai_kelompok.find_one({}, {"_id": 1}) or await db.nilai_perorangan.find_one({}, {"_id": 1})):
+        return []
+
+    daftar_tahun = sorted(await db.kelompok_tubes.distinct("tahun"))
+    for tahun in daftar_tahun:
+        for jenis in JENIS_REKAP:
+            await hitungUlangRekapTahun(jenis, tahun)
+    return daftar_tahun
+
+async def bacaRekapNilai(tahun, kelas):
+    """Baca kelompok beserta anggota dan rekap termaterialisasinya dalam satu agregasi."""
+    cursor = db.kelompok_tubes.aggregate([
+        {"$match": {
+            "tahun": { "$in" : tahun },
+            "kelas": { "$in" : kelas }
+        }},
+        {
+            "$lookup": {
+                "from": "users",
+                "localField": "id_anggota",
+                "foreignField": "_id",
+                "as": "anggota"
+            }
+        },
+        {"$addFields": {
+            "id_subjek": {"$concatArrays": [["$_id"], {"$ifNull": ["$id_anggota", []]}]}
+        }},
+        {
+            "$lookup": {
+                "from": "rekap_nilai",
+                "localField": "id_subjek",
+                "foreignField": "id_subjek",
+                "as": "rekap"
+            }
+        },
+        {
+            "$project": {
+                "nomor": 1,
+                "kelas": 1,
+                "tahun": 1,
+                "laporan": 1,
+                "anggota._id": 1,
+                "anggota.nama": 1,
+                "anggota.nim": 1,
+                "rekap.jenis": 1,
+                "rekap.id_subjek": 1,
+                "rekap.nilai": 1
+            }
+        }
+    ])
+    doc = await cursor.to_list(length=None)
+
+    for kelompok in doc:
+        rekap = {(item["jenis"], item["id_subjek"]): item["nilai"] for item in kelompok.pop("rekap", [])}
+        kelompok["nilaiAkhir"] = rekap.get(("kelompok", kelompok["_id"]), 0)
+        for anggota in kelompok.get("anggota", []):
+            anggota["nilaiPerorangan"] = rekap.get(("perorangan", anggota["_id"]), 0)
+    return doc
+
+async def bacaRekapNilaiKelompok(tahun, kelas):
+    doc = await bacaRekapNilai(tahun, kelas)
+    for kelompok in doc:
+        for anggota in kelompok.get("anggota", []):
+            del anggota["nilaiPerorangan"]
+    return convert_objectid(doc)
+
+async def bacaRekapNilaiPerorangan(tahun, kelas):
+    doc = await bacaRekapNilai(tahun, kelas)
+    return [
+        {
+            "nama": anggota["nama"],
+            "nim": anggota["nim"],
+            "kelas": kelompok["kelas"],
+            "tahun": kelompok["tahun"],
+            "nomor": kelompok["nomor"],
+            "nilaiPerorangan": anggota["nilaiPerorangan"],
+            "nilaiKelompok": kelompok["nilaiAkhir"],
+            "nilaiAkhir": (anggota["nilaiPerorangan"] + kelompok["nilaiAkhir"]) / 2
+        }
+        for kelompok in doc
+        for anggota in kelompok.get("anggota", [])
+    ]
+
+async def periksaKonsistensiRekap(tahun: list, toleransi: float = 1e-6):
+    """
+    Bandingkan rekap termaterialisasi dengan perhitungan penuh dari
+    nilai_kelompok/nilai_perorangan. Mengembalikan daftar selisih.
+    """
+    kelas = await db.kelompok_tubes.distinct("kelas", {"tahun": {"$in": tahun}})
+    selisih = []
+
+    hitung_kelompok = await getNilaiPerKelompok(tahun, kelas)
+    baca_kelompok = {kelompok["id"]: kelompok for kelompok in await bacaRekapNilaiKelompok(tahun, kelas)}
+    for kelompok in hitung_kelompok:
+        tersimpan = baca_kelompok.get(kelompok["id"], {}).get("nilaiAkhir", 0)
+        if abs(tersimpan - kelompok["nilaiAkhir"]) > toleransi:
+            selisih.append({
+                "jenis": "kelompok",
+                "id_subjek": kelompok["id"],
+                "tahun": kelompok["tahun"],
+                "kelas": kelompok["kelas"],
+                "nomor": kelompok["nomor"],
+                "tersimpan": tersimpan,
+                "seharusnya": kelompok["nilaiAkhir"]
+            })
+
+    def kunci(baris):
+        return (baris["tahun"], baris["kelas"], baris["nomor"], baris["nim"])
+
+    hitung_perorangan = await hitungRekapNilaiPerorangan(tahun, kelas)
+    baca_perorangan = {kunci(baris): baris for baris in await bacaRekapNilaiPerorangan(tahun, kelas)}
+    for baris in hitung_perorangan:
+        tersimpan = baca_perorangan.get(kunci(baris), {}).get("nilaiPerorangan", 0)
+        if abs(tersimpan - baris["nilaiPerorangan"]) > toleransi:
+            selisih.append({
+                "jenis": "perorangan",
+                "nim": baris["nim"],
+                "tahun": baris["tahun"],
+                "kelas": baris["kelas"],
+                "nomor": baris["nomor"],
+                "tersimpan": tersimpan,
+                "seharusnya": baris["nilaiPerorangan"]
+            })
+
+    return selisih
@@ -1,32 +1,36 @@
+import asyncio
+import hashlib
 from typing import List
+from core.cache import TTLCache
+from core.config import settings
+from core.logger import logger
 from utils.database import db, convert_objectid
+from utils.dataloader import loader
+from utils.json_codec import dumps
 from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import InsertOne, UpdateOne, DeleteMany, ReturnDocument
 
 async def getKelompokTubes(matchCondition: dict):
-    cursor = db.kelompok_tubes.aggregate([
-        {"$match": matchCondition},
-        {
-            "$lookup": {
-                "from": "users",
-                "localField": "id_anggota",
-                "foreignField": "_id",
-                "as": "anggota"
-            }
-        },
-        {
-            "$project": {
-                "nomor": 1,
-                "kelas": 1,
-                "tahun": 1,
-                "laporan": 1,
-                "anggota._id": 1,
-                "anggota.nama": 1,
-                "anggota.nim": 1,
-            }
-        }
-    ])
-
+    cursor = db.kelompok_tubes.find(matchCondition, {
+        "nomor": 1,
+        "kelas": 1,
+        "tahun": 1,
+        "laporan": 1,
+        "id_anggota": 1,
+    })
     doc = await cursor.to_list(length=None)
+
+    # anggota semua kelompok diambil lewat loader: satu $in ke users, urutan mengikuti id_anggota
+    anggota_list = await asyncio.gather(*(
+        loader("users").load_many(kelompok.pop("id_anggota", None) or [])
+        for kelompok in doc
+    ))
+    for kelompok, anggota in zip(doc, anggota_list):
+        kelompok["anggota"] = [
+            {field: user[field] for field in ("_id", "nama", "nim") if field in user}
+            for user in anggota if user is not None
+        ]
     return convert_objectid(doc)
 
 async def getNilaiKelompokTubes(id_kelompok: str, id_penilai):
@@ -43,14 +47,17 @@ async def getNilaiPerorangan(id_kelompok, id_penilai):
 
     kelompok = doc_kelompok_tubes[0]
     anggota = kelompok.get("anggota", [])
-    hasil = []
-    for item in anggota:
-        # hasil.append(item)
-        nilai = await db.nilai_perorangan.find_one({"id_mahasiswa": ObjectId(item["id"]), "id_penilai": ObjectId(id_penilai)})
-        item_result = convert_objectid(nilai) if nilai else None
-        hasil.append(item_result)
+    if not anggota:
+        return []
 
-    return hasil
+    # ambil nilai semua anggota sekaligus, urutan hasil tetap mengikuti anggota
+    doc_nilai = await db.nilai_perorangan.find({
+        "id_mahasiswa": {"$in": [ObjectId(item["id"]) for item in anggota]},
+        "id_penilai": ObjectId(id_penilai)
+    }).to_list(length=None)
+    nilai_per_mahasiswa = {str(nilai["id_mahasiswa"]): convert_objectid(nilai) for nilai in doc_nilai}
+
+    return [nilai_per_mahasiswa.get(item["id"]) for item in anggota]
 
 async def getAspekPenilaianKelompok(tahun: List[int]):
     cursor = db.aspek_penilaian_kelompok.aggregate([
@@ -86,6 +93,53 @@ async def getAspekPenilaianPerorangan(tahun: int):
     doc = await cursor.to_list(length=None)
     return convert_objectid(doc)
 
+# Versi aspek penilaian per (koleksi, tahun), dinaikkan setiap kali rubrik diubah.
+# Sumber kebenarannya koleksi aspek_penilaian_versi ({_id: {koleksi, tahun}, versi});
+# setiap worker menyalinnya ke memori dan menyegarkannya setiap ASPEK_VERSI_REFRESH
+# detik, jadi jalur request (termasuk 304) tidak membaca Mongo. Cache di-key dengan
+# versi, jadi perubahan di worker mana pun membuat entri lama tidak terpakai.
+versi_aspek = {}
+aspek_cache = TTLCache(settings.aspek_cache_size, settings.aspek_cache_ttl)
+
+async def naikkanVersiAspek(collection_name: str, tahun: int):
+    doc = await db.aspek_penilaian_versi.find_one_and_update(
+        {"_id": {"koleksi": collection_name, "tahun": tahun}},
+        {"$inc": {"versi": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    versi_aspek[(collection_name, tahun)] = doc["versi"]
+
+async def segarkanVersiAspek():
+    """Muat ulang semua versi aspek penilaian ke memori."""
+    global versi_aspek
+    terbaru = {
+        (doc["_id"]["koleksi"], doc["_id"]["tahun"]): doc["versi"]
+        async for doc in db.aspek_penilaian_versi.find({})
+    }
+    # Versi hanya naik: jangan timpa kenaikan lokal yang terjadi selama find berjalan
+    versi_aspek = {kunci: max(versi, versi_aspek.get(kunci, 0)) for kunci, versi in terbaru.items()}
+
+async def jalankanSegarkanVersiAspek():
+    """Task latar (dijalankan di lifespan)."""
+    while True:
+        try:
+            await segarkanVersiAspek()
+        except Exception as e:
+            logger.warning("Gagal menyegarkan versi aspek penilaian: %s", e)
+        await asyncio.sleep(settings.aspek_versi_refresh)
+
+async def getAspekPenilaianTerversi(collection_name: str, tahun: int, get_result_function: callable):
+    """Kembalikan (body JSON, strong ETag) aspek penilaian satu tahun, dari cache jika ada."""
+    kunci = (collection_name, tahun, versi_aspek.get((collection_name, tahun), 0))
+    entri = aspek_cache.get(kunci)
+    if entri is None:
+        body = dumps(await get_result_function([tahun]))
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        entri = (body, etag)
+        aspek_cache.set(kunci, entri)
+    return entri
+
 def extract_children_only(data, key_children="children"):
     result = []
 
@@ -106,37 +160,149 @@ def extract_children_only(data, key_children="children"):
 
     return result
 
+def pipelineSkorPanelis(collection_aspek: str, field_subjek: str = None):
+    """
+    Tahap pipeline untuk dokumen nilai_* (satu dokumen per panelis):
+    hitung skor berbobot tiap dokumen dengan bobot dari koleksi aspek.
+    Menghasilkan field `skor` per dokumen, dokumen tanpa nilai bernilai 0.
+    Jika `field_subjek` diisi, nilainya ikut dibawa sebagai `id_subjek`.
+    """
+    subjek = {"id_subjek": {"$first": f"${field_subjek}"}} if field_subjek else {}
+    return [
+        {"$unwind": {"path": "$nilai", "preserveNullAndEmptyArrays": True}},
+        {"$lookup": {
+            "from": collection_aspek,
+            "localField": "nilai.aspek_penilaian_id",
+            "foreignField": "_id",
+            "as": "aspek"
+        }},
+        {"$group": {
+            "_id": "$_id",
+            "id_penilai": {"$first": "$id_penilai"},
+            **subjek,
+            "skor": {"$sum": {
+                "$divide": [
+                    {"$multiply": [
+                        {"$ifNull": ["$nilai.nilai", 0]},
+                        {"$ifNull": [{"$arrayElemAt": ["$aspek.bobot", 0]}, 0]}
+                    ]},
+                    100
+                ]
+            }}
+        }}
+    ]
+
 async def getNilaiPerKelompok(tahun, kelas):
-# dapatkan data kelompok tubes dan aspek penilaian kelompok
-    kelompok_tubes_condition = {
-        "tahun": { "$in" : tahun },
-        "kelas": { "$in" : kelas }
-    }
-    doc_kelompok_tubes = await getKelompokTubes(kelompok_tubes_condition)
-    doc_aspek_penilaian_kelompok = await getAspekPenilaianKelompok(tahun)
-    doc_aspek_penilaian_kelompok = extract_children_only(doc_aspek_penilaian_kelompok)
-
-    for kelompok in doc_kelompok_tubes:
-        # ambil nilai kelompok oleh semua panelis
-        doc_nilai_kelompok = await db.nilai_kelompok.find({"id_kelompok": ObjectId(kelompok["id"])}).to_list(length=None)
-
-        # hitung per panelis
-        nilai_akhir = 0
-        jumlah_panelis = 0
-        for nilai_panelis in doc_nilai_kelompok:
-            jumlah_panelis += 1
-            
-            nilai_akhir_panelis = 0
-            item_nilai = convert_objectid(nilai_panelis.get("nilai", []))
-            for item in item_nilai:
-                # cari bobot dari aspek penilaian
-                bobot = next((ap["bobot"] for ap in doc_aspek_penilaian_kelompok if ap["id"] == item["aspek_penilaian_id"]), 0)
-                # jumlahkan nilai akhir panelis
-                nilai_akhir_panelis += (item["nilai"] * bobot / 100)
-            nilai_akhir += nilai_akhir_panelis
-            del nilai_panelis["nilai"]
-
-        # hiung nilai akhir dari semua panelis
-        kelompok["nilaiAkhir"] = (nilai_akhir / jumlah_panelis) if jumlah_panelis > 0 else 0
-    return doc_kelompok_tubes
+    # satu agregasi: kelompok + anggota + rata-rata skor berbobot semua panelis
+    cursor = db.kelompok_tubes.aggregate([
+        {"$match": {
+            "tahun": { "$in" : tahun },
+            "kelas": { "$in" : kelas }
+        }},
+        {
+            "$lookup": {
+                "from": "users",
+                "localField": "id_anggota",
+                "foreignField": "_id",
+                "as": "anggota"
+            }
+        },
+        {
+            "$lookup": {
+                "from": "nilai_kelompok",
+                "let": {"id_kelompok": "$_id"},
+                "pipeline": [
+                    {"$match": {"$expr": {"$eq": ["$id_kelompok", "$$id_kelompok"]}}},
+                    *pipelineSkorPanelis("aspek_penilaian_kelompok"),
+                    {"$group": {"_id": None, "rata": {"$avg": "$skor"}}}
+                ],
+                "as": "rekap"
+            }
+        },
+        {
+            "$project": {
+                "nomor": 1,
+                "kelas": 1,
+                "tahun": 1,
+                "laporan": 1,
+                "anggota._id": 1,
+                "anggota.nama": 1,
+                "anggota.nim": 1,
+                "nilaiAkhir": {"$ifNull": [{"$arrayElemAt": ["$rekap.rata", 0]}, 0]}
+            }
+        }
+    ])
+
+    doc = await cursor.to_list(length=None)
+    return convert_objectid(doc)
+
+
+def rencanakanDiffAspek(body: list, doc_lama: list, tahun):
+    """
+    Bandingkan pohon aspek penilaian dari request dengan dokumen lama satu tahun
+    dan susun operasi bulk_write (insert/update/delete) beserta ringkasannya.
+    ObjectId parent baru dibuat di sisi client supaya children bisa langsung merujuknya.
+    """
+    lama = {doc["_id"]: doc for doc in doc_lama}
+    dipertahankan = set()
+    # Dikelompokkan per jenis: bulk_write ordered memecah batch setiap kali jenis
+    # operasi berganti, jadi insert/update yang berselang-seling menjadi banyak command
+    operasi_insert = []
+    operasi_update = []
+    diff = {"inserted": 0, "updated": 0, "unchanged": 0, "deleted": 0}
+
+    def rencanakan(id_dokumen, data):
+        try:
+            object_id = ObjectId(id_dokumen) if id_dokumen else None
+        except (InvalidId, TypeError):
+            object_id = None
+
+        if object_id is None:
+            object_id = ObjectId()
+            operasi_insert.append(InsertOne({"_id": object_id, **data}))
+            diff["inserted"] += 1
+        elif object_id in lama:
+            doc = lama[object_id]
+            if any(doc.get(key) != value for key, value in data.items()):
+                operasi_update.append(UpdateOne({"_id": object_id}, {"$set": data}))
+                diff["updated"] += 1
+            else:
+                diff["unchanged"] += 1
+        else:
+            # id dari client tapi belum ada di tahun ini
+            operasi_update.append(UpdateOne({"_id": object_id}, {"$set": data}, upsert=True))
+            diff["inserted"] += 1
+
+        dipertahankan.add(object_id)
+        return object_id
+
+    for item in body:
+        parent_id = rencanakan(item.get("id"), {
+            "kriteria": item["kriteria"],
+            "tahun": tahun,
+            "isParent": True
+        })
+
+        for child in item.get("children", []):
+            rencanakan(child.get("id"), {
+                "kriteria": child["kriteria"],
+                "bobot": child["bobot"],
+                "tahun": tahun,
+                "isParent": False,
+                "parentId": parent_id
+            })
+
+    # Hapus dokumen yang tidak ada di request, termasuk anak dari parent yang dihapus
+    dihapus = [id_lama for id_lama in lama if id_lama not in dipertahankan]
+    parent_dihapus = [id_lama for id_lama in dihapus if lama[id_lama].get("isParent")]
+    operasi_tulis = operasi_insert + operasi_update
+    if dihapus:
+        operasi_tulis.append(DeleteMany({
+            "$or": [
+                {"_id": {"$in": dihapus}},
+                {"parentId": {"$in": parent_dihapus}}
+            ]
+        }))
+        diff["deleted"] = len(dihapus)
 
+    return operasi_tulis, diff
@@ -0,0 +1,107 @@
+"""
+Test integrasi terhadap mongod sungguhan: jumlah command dihitung lewat
+listener pymongo, yang tidak berjalan di mock. Gunakan database khusus test,
+isinya dikosongkan di setiap test:
+
+    MONGO_DB=labnet_test python -m pytest tests
+
+Test yang butuh Mongo dilewati jika MONGO_DB tidak berakhiran "_test" atau
+server tidak bisa dihubungi.
+"""
+import asyncio
+import random
+import httpx
+import pytest
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+from core.config import settings
+
+KOLEKSI_TEST = [
+    "users", "kelompok_tubes", "aspek_penilaian_kelompok", "aspek_penilaian_perorangan",
+    "aspek_penilaian_versi", "nilai_kelompok", "nilai_perorangan", "rekap_nilai",
+    "sessions", "session_revocations",
+]
+
+TAHUN_TEST = 2099
+KELAS_TEST = ["A", "B"]
+JUMLAH_KELOMPOK = 12
+ANGGOTA_PER_KELOMPOK = 3
+JUMLAH_PANELIS = 2
+
+@pytest.fixture(scope="session")
+def mongo():
+    if not settings.mongo_db.endswith("_test"):
+        pytest.skip(f"MONGO_DB '{settings.mongo_db}' bukan database test (harus berakhiran _test)")
+    client = MongoClient(settings.mongo_uri, serverSelectionTimeoutMS=2000, **settings.mongo_client_options)
+    try:
+        client.admin.command("ping")
+    except PyMongoError as e:
+        pytest.skip(f"MongoDB tidak bisa dihubungi: {e}")
+    finally:
+        client.close()
+
+async def isiDataTubes():
+    """Kelompok, anggota, rubrik, nilai dua panelis dan rekap_nilai untuk TAHUN_TEST."""
+    from benchmarks.dataset import buatAspek, buatNilai, buatUsers
+    from services.rekap_nilai import JENIS_REKAP, hitungUlangRekapTahun
+    from utils.database import db
+
+    for collection_name in KOLEKSI_TEST:
+        await db[collection_name].delete_many({})
+
+    rng = random.Random(42)
+    asisten, mahasiswa = buatUsers(rng, JUMLAH_KELOMPOK * ANGGOTA_PER_KELOMPOK, JUMLAH_PANELIS)
+    await db.users.insert_many(asisten + mahasiswa)
+
+    kelompok = [
+        {
+            "nomor": i // len(KELAS_TEST) + 1,
+            "kelas": KELAS_TEST[i % len(KELAS_TEST)],
+            "tahun": TAHUN_TEST,
+            "laporan": "",
+            "id_anggota": [item["_id"] for item in mahasiswa[i * ANGGOTA_PER_KELOMPOK:(i + 1) * ANGGOTA_PER_KELOMPOK]],
+        }
+        for i in range(JUMLAH_KELOMPOK)
+    ]
+    await db.kelompok_tubes.insert_many(kelompok)
+
+    aspek_kelompok = buatAspek(TAHUN_TEST, 3, 2)
+    aspek_perorangan = buatAspek(TAHUN_TEST, 2, 2)
+    await db.aspek_penilaian_kelompok.insert_many(aspek_kelompok)
+    await db.aspek_penilaian_perorangan.insert_many(aspek_perorangan)
+
+    panelis = [item["_id"] for item in asisten]
+    await db.nilai_kelompok.insert_many(buatNilai(
+        rng, [{"id_kelompok": item["_id"]} for item in kelompok], aspek_kelompok, panelis
+    ))
+    await db.nilai_perorangan.insert_many(buatNilai(
+        rng,
+        [{"id_kelompok": item["_id"], "id_mahasiswa": id_anggota} for item in kelompok for id_anggota in item["id_anggota"]],
+        aspek_perorangan, panelis
+    ))
+    for jenis in JENIS_REKAP:
+        await hitungUlangRekapTahun(jenis, TAHUN_TEST)
+
+    return {"asisten": asisten, "kelompok": kelompok}
+
+@pytest.fixture
+def jalankan(mongo):
+    """
+    Jalankan `skenario(client, data)` di dalam lifespan aplikasi dengan data
+    tubes yang baru diisi; client httpx in-process sudah membawa session asisten.
+    """
+    from core.auth import create_session
+    from main import app, lifespan
+
+    async def dalamAplikasi(skenario):
+        async with lifespan(app):
+            data = await isiDataTubes()
+            session_id = await create_session(data["asisten"][0])
+            async with httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=app),
+                base_url="http://test",
+                headers={"Authorization": f"Bearer {session_id}"}
+            ) as client:
+                return await skenario(client, data)
+
+    return lambda skenario: asyncio.run(dalamAplikasi(skenario))
@@ -0,0 +1,137 @@
+"""Token sesi bertanda tangan HMAC (SESSION_MODE=token); tidak butuh Mongo."""
+import asyncio
+import time
+import orjson
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+from pydantic import ValidationError
+from core import auth
+from core.config import Settings, settings
+
+SECRET_TEST = "s" * 32
+
+USER = {"_id": ObjectId(), "role": "asisten", "nim": 9900001}
+
+@pytest.fixture(autouse=True)
+def mode_token(monkeypatch):
+    monkeypatch.setattr(settings, "session_mode", "token")
+    monkeypatch.setattr(settings, "session_secret", SECRET_TEST)
+    monkeypatch.setattr(auth, "revoked_jti", set())
+
+def tokenDariPayload(payload) -> str:
+    """Token bertanda tangan sah untuk payload apa pun (termasuk yang tidak valid)."""
+    payload_b64 = auth._b64encode(orjson.dumps(payload))
+    return f"{payload_b64}.{auth._tanda_tangan(payload_b64)}"
+
+def payloadSah(**ubah) -> dict:
+    return {
+        "uid": str(USER["_id"]),
+        "role": USER["role"],
+        "nim": USER["nim"],
+        "exp": int(time.time()) + 60,
+        "jti": "jti-test",
+        **ubah,
+    }
+
+def cekDitolak(token: str):
+    with pytest.raises(HTTPException) as info:
+        auth.verifikasiToken(token)
+    assert info.value.status_code == 401
+
+def test_token_sah():
+    payload = auth.verifikasiToken(auth.buatToken(USER))
+    assert payload["uid"] == str(USER["_id"])
+    assert payload["role"] == "asisten"
+
+def test_signature_diubah():
+    payload_b64, _, signature = auth.buatToken(USER).partition(".")
+    pengganti = "A" if signature[0] != "A" else "B"
+    cekDitolak(f"{payload_b64}.{pengganti}{signature[1:]}")
+
+def test_payload_diubah_dengan_signature_lama():
+    _, _, signature = auth.buatToken(USER).partition(".")
+    payload_b64 = auth._b64encode(orjson.dumps(payloadSah(role="admin")))
+    cekDitolak(f"{payload_b64}.{signature}")
+
+def test_signature_dari_secret_lain(monkeypatch):
+    token = auth.buatToken(USER)
+    monkeypatch.setattr(settings, "session_secret", "t" * 32)
+    cekDitolak(token)
+
+@pytest.mark.parametrize("token", ["", ".", "tanpa-titik", "abc.", ".abc"])
+def test_token_tidak_berbentuk(token):
+    cekDitolak(token)
+
+def test_payload_bukan_base64_json():
+    # signature sah, tapi isi payload bukan JSON / bukan base64
+    for payload_b64 in ["bm90LWpzb24", "@@@", "e3", "a"]:
+        cekDitolak(f"{payload_b64}.{auth._tanda_tangan(payload_b64)}")
+
+def test_payload_bukan_object():
+    cekDitolak(tokenDariPayload(["uid", "exp"]))
+
+def test_payload_tanpa_padding_tetap_sah():
+    # base64url tanpa "=": panjang payload tidak selalu kelipatan 4
+    for nim in (1, 12, 123):
+        token = tokenDariPayload(payloadSah(nim=nim))
+        assert "=" not in token
+        assert auth.verifikasiToken(token)["nim"] == nim
+
+def test_token_kedaluwarsa():
+    cekDitolak(tokenDariPayload(payloadSah(exp=int(time.time()) - 1)))
+
+def test_token_tanpa_exp():
+    payload = payloadSah()
+    del payload["exp"]
+    cekDitolak(tokenDariPayload(payload))
+
+def test_jti_dicabut(monkeypatch):
+    monkeypatch.setattr(auth, "revoked_jti", {"jti-test"})
+    cekDitolak(tokenDariPayload(payloadSah()))
+
+class KoleksiPalsu:
+    def __init__(self):
+        self.panggilan = []
+
+    async def update_one(self, filter, update, upsert=False):
+        self.panggilan.append((filter, update, upsert))
+
+class DatabasePalsu:
+    def __init__(self):
+        self.session_revocations = KoleksiPalsu()
+
+def test_revoke_session_mencabut_token(monkeypatch):
+    db = DatabasePalsu()
+    monkeypatch.setattr(auth, "db", db)
+    token = auth.buatToken(USER)
+    jti = auth.verifikasiToken(token)["jti"]
+
+    asyncio.run(auth.revoke_session(token, USER))
+
+    cekDitolak(token)
+    [(filter, update, upsert)] = db.session_revocations.panggilan
+    assert filter == {"_id": jti}
+    assert upsert
+    assert "expires_at" in update["$set"]
+
+def test_revoke_session_menolak_token_tidak_sah(monkeypatch):
+    db = DatabasePalsu()
+    monkeypatch.setattr(auth, "db", db)
+    with pytest.raises(HTTPException):
+        asyncio.run(auth.revoke_session("bukan.token", USER))
+    assert db.session_revocations.panggilan == []
+
+def buatSettings(**kwargs):
+    return Settings(_env_file=None, mongo_username="u", mongo_password="p", mongo_db="labnet_test", **kwargs)
+
+@pytest.mark.parametrize("secret", [None, "", "s" * 31])
+def test_secret_pendek_ditolak(secret):
+    with pytest.raises(ValidationError):
+        buatSettings(session_mode="token", session_secret=secret)
+
+def test_secret_cukup_diterima():
+    assert buatSettings(session_mode="token", session_secret="s" * 32).session_secret == "s" * 32
+
+def test_mode_mongo_tanpa_secret():
+    assert buatSettings(session_mode="mongo").session_secret is None
@@ -0,0 +1,106 @@
+"""Keyset pagination dengan kunci urutan null/kosong, disimulasikan tanpa Mongo."""
+import pytest
+from fastapi import HTTPException
+from utils.pagination import decode_cursor, encode_cursor, keyset_page, keyset_stages
+
+def nilaiSort(value):
+    # Urutan Mongo untuk kasus ini: null/field kosong < angka < string
+    if value is None:
+        return (0, 0)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    return (2, value)
+
+def sebanding(a, b) -> bool:
+    # Type bracketing: $gt/$lt hanya membandingkan nilai bertipe sama
+    return a is not None and b is not None and nilaiSort(a)[0] == nilaiSort(b)[0]
+
+def cocok(doc: dict, kondisi: dict) -> bool:
+    for key, expected in kondisi.items():
+        if key == "$or":
+            if not any(cocok(doc, item) for item in expected):
+                return False
+            continue
+        value = doc.get(key)
+        if isinstance(expected, dict):
+            for operator, operand in expected.items():
+                if operator == "$gt" and not (sebanding(value, operand) and value > operand):
+                    return False
+                if operator == "$lt" and not (sebanding(value, operand) and value < operand):
+                    return False
+                if operator == "$ne" and value == operand:
+                    return False
+                if operator == "$exists" and (key in doc) != operand:
+                    return False
+        elif value != expected:
+            return False
+    return True
+
+def jalankanPipeline(docs: list, stages: list) -> list:
+    hasil = list(docs)
+    for stage in stages:
+        if "$match" in stage:
+            hasil = [doc for doc in hasil if cocok(doc, stage["$match"])]
+        elif "$sort" in stage:
+            for field, direction in reversed(list(stage["$sort"].items())):
+                hasil.sort(key=lambda doc: nilaiSort(doc.get(field)), reverse=direction == -1)
+        elif "$limit" in stage:
+            hasil = hasil[:stage["$limit"]]
+    return hasil
+
+def semuaHalaman(docs: list, sort_fields: list, limit: int) -> list:
+    urutan = []
+    after = None
+    for _ in range(len(docs) + 1):
+        halaman = keyset_page(jalankanPipeline(docs, keyset_stages(sort_fields, limit, after)), sort_fields, limit)
+        urutan.extend(doc["_id"] for doc in halaman["data"])
+        after = halaman["next"]
+        if after is None:
+            return urutan
+    raise AssertionError("Pagination tidak berhenti")
+
+DOCS = [
+    {"_id": 1, "nama": "Kabel"},
+    {"_id": 2, "nama": None},
+    {"_id": 3},
+    {"_id": 4, "nama": "Antena"},
+    {"_id": 5, "nama": None},
+    {"_id": 6, "nama": "Router"},
+    {"_id": 7, "nama": "Kabel"},
+]
+
+@pytest.mark.parametrize("sort_fields", [
+    [("nama", 1), ("_id", 1)],
+    [("nama", -1), ("_id", -1)],
+    [("nama", -1), ("_id", 1)],
+])
+@pytest.mark.parametrize("limit", [1, 2, 3])
+def test_semua_dokumen_terlewati_dengan_kunci_null(sort_fields, limit):
+    seharusnya = [doc["_id"] for doc in jalankanPipeline(DOCS, [{"$sort": dict(sort_fields)}])]
+    assert semuaHalaman(DOCS, sort_fields, limit) == seharusnya
+
+def test_cursor_null_menaik_melanjutkan_ke_nilai_tidak_null():
+    stages = keyset_stages([("nama", 1), ("_id", 1)], 2, encode_cursor([None, 5]))
+    assert stages[0] == {"$match": {"$or": [
+        {"nama": {"$ne": None}},
+        {"nama": None, "_id": {"$gt": 5}},
+    ]}}
+    assert [doc["_id"] for doc in jalankanPipeline(DOCS, stages)] == [4, 1, 7]
+
+def test_cursor_null_menurun_hanya_sisa_null():
+    stages = keyset_stages([("nama", -1), ("_id", -1)], 10, encode_cursor([None, 3]))
+    assert stages[0] == {"$match": {"$or": [
+        {"nama": None, "$or": [{"_id": {"$lt": 3}}, {"_id": None}]},
+    ]}}
+    assert [doc["_id"] for doc in jalankanPipeline(DOCS, stages)] == [2]
+
+def test_cursor_menurun_tidak_melewatkan_null():
+    stages = keyset_stages([("nama", -1), ("_id", -1)], 10, encode_cursor(["Antena", 4]))
+    assert [doc["_id"] for doc in jalankanPipeline(DOCS, stages)] == [5, 3, 2]
+
+def test_cursor_berisi_null_bisa_didecode():
+    assert decode_cursor(encode_cursor([None, 5])) == [None, 5]
+
+def test_cursor_tidak_valid():
+    with pytest.raises(HTTPException):
+        keyset_stages([("nama", 1), ("_id", 1)], 2, "bukan-cursor")
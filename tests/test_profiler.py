@@ -0,0 +1,66 @@
+"""Profiler query lambat tanpa Mongo: explain tidak boleh ikut terhitung di request."""
+import asyncio
+import contextvars
+import threading
+from types import SimpleNamespace
+from utils.dataloader import dataloader_var
+from utils.profiler import SlowQueryProfiler
+from utils.query_budget import hitungQueryMongo, query_budget_listener, query_stats_var
+
+def eventCommand(request_id, command_name="find", command=None, duration_micros=0):
+    return SimpleNamespace(
+        request_id=request_id,
+        command_name=command_name,
+        command=command or {command_name: "barang", "filter": {"nama": "x"}},
+        database_name="labnet_test",
+        duration_micros=duration_micros,
+    )
+
+class DatabasePalsu:
+    """Meniru explain lewat client Motor: listener dipanggil di context pemanggil."""
+    def __init__(self, context_explain):
+        self.context_explain = context_explain
+
+    async def command(self, command):
+        query_budget_listener.started(eventCommand(99, "explain", command))
+        self.context_explain.append((query_stats_var.get(), dataloader_var.get()))
+        return {"queryPlanner": {"winningPlan": {"stage": "COLLSCAN"}}}
+
+class ClientPalsu:
+    def __init__(self):
+        self.context_explain = []
+
+    def __getitem__(self, database_name):
+        return DatabasePalsu(self.context_explain)
+
+def test_explain_tidak_menambah_hitungan_request():
+    profiler = SlowQueryProfiler(ambang_ms=1, kapasitas=10)
+    client = ClientPalsu()
+
+    async def request():
+        profiler.attach(asyncio.get_running_loop(), client)
+        dataloader_var.set({})
+        with hitungQueryMongo() as stats:
+            # Seperti Motor: listener berjalan di thread executor dengan context request
+            context = contextvars.copy_context()
+            event = eventCommand(1, duration_micros=50_000)
+
+            def commandLambat():
+                query_budget_listener.started(event)
+                profiler.started(event)
+                profiler.succeeded(event)
+
+            thread = threading.Thread(target=context.run, args=(commandLambat,))
+            thread.start()
+            thread.join()
+            # beri kesempatan explain berjalan selama request masih aktif
+            for _ in range(5):
+                await asyncio.sleep(0)
+        profiler.detach()
+        return stats
+
+    stats = asyncio.run(request())
+
+    assert stats.jumlah == 1, stats.rincian()
+    assert client.context_explain == [(None, None)]
+    assert profiler.stats()["entri"][0]["rencana"] is not None
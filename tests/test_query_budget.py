@@ -0,0 +1,102 @@
+"""
+Batas jumlah command Mongo per endpoint/fungsi rekap dan aspek penilaian.
+Dataset berisi JUMLAH_KELOMPOK kelompok, jadi pola N+1 (satu query per
+kelompok/anggota/aspek) langsung melewati batas di bawah.
+
+Batas endpoint sudah termasuk autentikasi mode mongo (sessions + users).
+"""
+from conftest import JUMLAH_KELOMPOK, KELAS_TEST, TAHUN_TEST
+from utils.query_budget import maksimalQueryMongo
+
+AUTENTIKASI = 2
+
+PARAM_REKAP = [("tahun", TAHUN_TEST), *(("kelas", kelas) for kelas in KELAS_TEST)]
+
+def test_rekap_nilai_kelompok(jalankan):
+    async def skenario(client, data):
+        with maksimalQueryMongo(AUTENTIKASI + 1):
+            response = await client.get("/tugas_besar/rekap/nilai-kelompok", params=PARAM_REKAP)
+        assert response.status_code == 200
+        assert len(response.json()) == JUMLAH_KELOMPOK
+
+    jalankan(skenario)
+
+def test_rekap_nilai_perorangan(jalankan):
+    async def skenario(client, data):
+        with maksimalQueryMongo(AUTENTIKASI + 1):
+            response = await client.get("/tugas_besar/rekap/nilai-perorangan", params=PARAM_REKAP)
+        assert response.status_code == 200
+        assert len(response.json()) == sum(len(item["id_anggota"]) for item in data["kelompok"])
+
+    jalankan(skenario)
+
+def test_get_nilai_per_kelompok(jalankan):
+    from services.tugas_besar import getNilaiPerKelompok
+
+    async def skenario(client, data):
+        with maksimalQueryMongo(1):
+            hasil = await getNilaiPerKelompok([TAHUN_TEST], KELAS_TEST)
+        assert len(hasil) == JUMLAH_KELOMPOK
+        assert all(kelompok["nilaiAkhir"] > 0 for kelompok in hasil)
+
+    jalankan(skenario)
+
+def test_hitung_rekap_nilai_perorangan(jalankan):
+    from services.rekap_nilai import hitungRekapNilaiPerorangan
+
+    async def skenario(client, data):
+        # kelompok + anggota, rubrik perorangan, nilai semua anggota
+        with maksimalQueryMongo(3):
+            hasil = await hitungRekapNilaiPerorangan([TAHUN_TEST], KELAS_TEST)
+        assert len(hasil) == sum(len(item["id_anggota"]) for item in data["kelompok"])
+
+    jalankan(skenario)
+
+def test_get_nilai_perorangan(jalankan):
+    async def skenario(client, data):
+        id_kelompok = str(data["kelompok"][0]["_id"])
+        # kelompok, anggota (satu $in lewat loader), nilai semua anggota
+        with maksimalQueryMongo(AUTENTIKASI + 3):
+            response = await client.get("/tugas_besar/penilaian/nilai-perorangan", params={"id_kelompok": id_kelompok})
+        assert response.status_code == 200
+        assert len(response.json()) == len(data["kelompok"][0]["id_anggota"])
+
+    jalankan(skenario)
+
+def test_upsert_aspek_penilaian(jalankan):
+    async def skenario(client, data):
+        body = [
+            {
+                "kriteria": f"Kriteria {i}",
+                "tahun": TAHUN_TEST,
+                "children": [{"kriteria": f"Kriteria {i}.{j}", "bobot": 5} for j in range(2)],
+            }
+            for i in range(6)
+        ]
+        # Rubrik tahun ini diganti dengan 6 induk x 2 anak
+        response = await client.post("/tugas_besar/aspek/penilaian-kelompok", json=body)
+        assert response.status_code == 200
+
+        # Ubah bobot semua anak, tambah satu anak per induk, hapus induk terakhir:
+        # update dan insert berselang-seling per induk
+        pohon = response.json()["aspek_penilaian"][:-1]
+        body = [
+            {
+                "id": induk["id"],
+                "kriteria": induk["kriteria"],
+                "tahun": TAHUN_TEST,
+                "children": [
+                    *({"id": anak["id"], "kriteria": anak["kriteria"], "bobot": 3} for anak in induk["children"]),
+                    {"kriteria": f"{induk['kriteria']}.baru", "bobot": 4},
+                ],
+            }
+            for induk in pohon
+        ]
+        # pohon lama, insert + update + delete, versi, hitung ulang rekap (kelompok,
+        # agregasi, update + delete), pohon baru
+        with maksimalQueryMongo(AUTENTIKASI + 10):
+            response = await client.post("/tugas_besar/aspek/penilaian-kelompok", json=body)
+        assert response.status_code == 200
+        assert response.json()["diff"] == {"inserted": 5, "updated": 10, "unchanged": 5, "deleted": 3}
+
+    jalankan(skenario)
@@ -1,13 +1,71 @@
 from motor.motor_asyncio import AsyncIOMotorClient
 from bson import ObjectId
-from core.config import Settings
+from core.config import settings
+from utils.pool_monitor import pool_statistik
+from core.metrics import mongo_command_metrics
+from utils.profiler import slow_query_profiler
+from utils.query_budget import query_budget_listener
 import re
 
-settings = Settings()
-
-# Inisialisasi client dan db secara global
-client = AsyncIOMotorClient(settings.mongo_uri)
-db = client[settings.mongo_db]
+# Client Mongo dibuat per proses worker lewat connect() di lifespan aplikasi,
+# bukan saat import, supaya aman dipakai dengan gunicorn --preload (fork).
+_client = None
+_database = None
+
+def connect():
+    global _client, _database
+    if _client is None:
+        event_listeners = [pool_statistik, mongo_command_metrics, query_budget_listener]
+        if settings.profiler_slow_ms is not None:
+            event_listeners.append(slow_query_profiler)
+        _client = AsyncIOMotorClient(
+            settings.mongo_uri,
+            event_listeners=event_listeners,
+            **settings.mongo_client_options
+        )
+        _database = _client[settings.mongo_db]
+    return _client
+
+def close():
+    global _client, _database
+    if _client is not None:
+        _client.close()
+    _client = None
+    _database = None
+
+# Transaksi multi-dokumen (sirkulasi) butuh replica set atau mongos;
+# diisi cekDukunganTransaksi() saat startup
+transaksi_didukung = None
+
+async def cekDukunganTransaksi() -> bool:
+    global transaksi_didukung
+    hello = await get_database().command("hello")
+    transaksi_didukung = bool(hello.get("setName")) or hello.get("msg") == "isdbgrid"
+    return transaksi_didukung
+
+def get_transaksi_didukung():
+    """None jika belum dicek (mis. script tanpa startup)."""
+    return transaksi_didukung
+
+def get_client():
+    if _client is None:
+        raise RuntimeError("Mongo client belum dibuat, panggil connect() terlebih dahulu")
+    return _client
+
+def get_database():
+    if _database is None:
+        raise RuntimeError("Mongo client belum dibuat, panggil connect() terlebih dahulu")
+    return _database
+
+class _DatabaseProxy:
+    """Proxy ke database aktif, jadi `from utils.database import db` tetap bisa dipakai di level modul."""
+    def __getattr__(self, name):
+        return getattr(get_database(), name)
+
+    def __getitem__(self, name):
+        return get_database()[name]
+
+db = _DatabaseProxy()
 
 def convert_objectid(data):
     """
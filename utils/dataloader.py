@@ -0,0 +1,84 @@
+import asyncio
+from contextvars import ContextVar
+from bson import ObjectId
+from utils.database import db
+
+class DataLoader:
+    """
+    Batching + memo pembacaan dokumen berdasarkan _id untuk satu koleksi.
+    Semua load() dalam satu putaran event loop digabung menjadi satu
+    find({"_id": {"$in": [...]}}), dan setiap _id hanya diambil sekali
+    selama umur loader (satu request, lihat DataLoaderMiddleware).
+    Hasilnya salinan dangkal dokumen, None jika tidak ditemukan.
+    """
+    def __init__(self, collection_name: str):
+        self.collection_name = collection_name
+        self._memo = {}
+        self._antrean = {}
+
+    async def load(self, id_dokumen):
+        if id_dokumen is None:
+            return None
+        id_dokumen = ObjectId(id_dokumen)
+
+        future = self._memo.get(id_dokumen)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self._memo[id_dokumen] = loop.create_future()
+            if not self._antrean:
+                # Kirim setelah task lain yang siap di putaran ini ikut mengantre
+                loop.call_soon(self._kirim)
+            self._antrean[id_dokumen] = future
+
+        doc = await asyncio.shield(future)
+        return dict(doc) if doc is not None else None
+
+    async def load_many(self, id_list) -> list:
+        """Urutan hasil mengikuti `id_list`."""
+        return list(await asyncio.gather(*(self.load(id_dokumen) for id_dokumen in id_list)))
+
+    def prime(self, doc: dict):
+        """Isi memo dengan dokumen yang sudah dibaca lewat jalur lain."""
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(doc)
+        self._memo[doc["_id"]] = future
+
+    def clear(self, id_dokumen):
+        """Buang memo satu _id, panggil setelah dokumennya diubah."""
+        self._memo.pop(ObjectId(id_dokumen), None)
+
+    def _kirim(self):
+        antrean, self._antrean = self._antrean, {}
+        asyncio.ensure_future(self._ambil(antrean))
+
+    async def _ambil(self, antrean: dict):
+        try:
+            docs = await db[self.collection_name].find({"_id": {"$in": list(antrean)}}).to_list(length=None)
+        except Exception as e:
+            for id_dokumen, future in antrean.items():
+                # Jangan memo kegagalan, load berikutnya mencoba lagi
+                self._memo.pop(id_dokumen, None)
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        docs_by_id = {doc["_id"]: doc for doc in docs}
+        for id_dokumen, future in antrean.items():
+            if not future.done():
+                future.set_result(docs_by_id.get(id_dokumen))
+
+# Loader per koleksi milik request aktif, diisi DataLoaderMiddleware
+dataloader_var = ContextVar("dataloader", default=None)
+
+def loader(collection_name: str) -> DataLoader:
+    """
+    Loader `collection_name` untuk request aktif. Di luar request (script,
+    benchmark) dibuat loader baru setiap panggilan: batching tetap berlaku,
+    memo tidak.
+    """
+    loaders = dataloader_var.get()
+    if loaders is None:
+        return DataLoader(collection_name)
+    if collection_name not in loaders:
+        loaders[collection_name] = DataLoader(collection_name)
+    return loaders[collection_name]
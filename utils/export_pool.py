@@ -0,0 +1,111 @@
+import asyncio
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException
+from core import metrics
+from core.config import settings
+
+# Thread pool khusus render ekspor (xlsxwriter, kompresi zip, baca berkas),
+# terpisah dari threadpool default supaya ekspor besar tidak menghabiskan
+# thread untuk endpoint sync dan Motor. Thread dibuat saat pertama dipakai,
+# jadi aman untuk gunicorn --preload.
+export_executor = ThreadPoolExecutor(max_workers=settings.export_workers, thread_name_prefix="ekspor")
+
+# Ekspor yang boleh berjalan/antre bersamaan; lebih dari ini ditolak 503
+BATAS_EKSPOR = settings.export_workers + settings.export_max_antrean
+
+_lock = threading.Lock()
+_statistik = {
+    "slot_terpakai": 0,
+    "tugas_antre": 0,
+    "tugas_berjalan": 0,
+    "ditolak": 0,
+    "selesai": 0,
+}
+
+class SlotEkspor:
+    """Satu ekspor yang sudah diterima; lepas() idempoten."""
+    __slots__ = ("_dilepas", "__weakref__")
+
+    def __init__(self):
+        self._dilepas = False
+
+    def lepas(self):
+        with _lock:
+            if self._dilepas:
+                return
+            self._dilepas = True
+            _statistik["slot_terpakai"] -= 1
+            _statistik["selesai"] += 1
+
+def ambilSlotEkspor() -> SlotEkspor:
+    """
+    Terima satu ekspor atau raise HTTPException 503 (dengan Retry-After) jika
+    pool penuh. Dipanggil sebelum StreamingResponse dikembalikan, karena status
+    tidak bisa diubah lagi setelah body mulai dikirim.
+    """
+    with _lock:
+        if _statistik["slot_terpakai"] >= BATAS_EKSPOR:
+            _statistik["ditolak"] += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Server sedang memproses terlalu banyak ekspor, coba lagi nanti",
+                headers={"Retry-After": str(settings.export_retry_after)}
+            )
+        _statistik["slot_terpakai"] += 1
+    return SlotEkspor()
+
+def jagaSlot(generator, slot: SlotEkspor):
+    """
+    Generator body melepas slot di blok finally-nya; penjaga ini melepasnya
+    jika generator tidak pernah dijalankan (mis. klien putus sebelum body dikirim).
+    """
+    weakref.finalize(generator, slot.lepas)
+    return generator
+
+def _jalankan(fn, args):
+    with _lock:
+        _statistik["tugas_antre"] -= 1
+        _statistik["tugas_berjalan"] += 1
+    try:
+        return fn(*args)
+    finally:
+        with _lock:
+            _statistik["tugas_berjalan"] -= 1
+
+async def render(fn, *args):
+    """Jalankan fungsi render sync di export_executor tanpa memblokir event loop."""
+    with _lock:
+        _statistik["tugas_antre"] += 1
+    return await asyncio.get_running_loop().run_in_executor(export_executor, _jalankan, fn, args)
+
+def stats() -> dict:
+    with _lock:
+        return {**_statistik, "batas": BATAS_EKSPOR, "workers": settings.export_workers}
+
+def _metrics_lines():
+    data = stats()
+    worker = metrics.labels()
+    return [
+        "# HELP export_slots_in_use Ekspor xlsx yang sedang berjalan atau antre.",
+        "# TYPE export_slots_in_use gauge",
+        f"export_slots_in_use{{{worker}}} {data['slot_terpakai']}",
+        "# HELP export_slots_limit Batas ekspor bersamaan sebelum ditolak 503.",
+        "# TYPE export_slots_limit gauge",
+        f"export_slots_limit{{{worker}}} {data['batas']}",
+        "# HELP export_tasks_queued Tugas render yang menunggu thread pool ekspor.",
+        "# TYPE export_tasks_queued gauge",
+        f"export_tasks_queued{{{worker}}} {data['tugas_antre']}",
+        "# HELP export_tasks_running Tugas render yang sedang berjalan di thread pool ekspor.",
+        "# TYPE export_tasks_running gauge",
+        f"export_tasks_running{{{worker}}} {data['tugas_berjalan']}",
+        "# HELP export_rejected_total Ekspor yang ditolak karena pool penuh.",
+        "# TYPE export_rejected_total counter",
+        f"export_rejected_total{{{worker}}} {data['ditolak']}",
+        "# HELP export_completed_total Ekspor yang selesai atau dibatalkan.",
+        "# TYPE export_completed_total counter",
+        f"export_completed_total{{{worker}}} {data['selesai']}",
+    ]
+
+metrics.register_collector(_metrics_lines)
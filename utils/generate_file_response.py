@@ -1,58 +1,172 @@
 import csv
 import io
-import pandas as pd
+import os
+import tempfile
+from datetime import date, datetime
+import xlsxwriter
 from fastapi.responses import StreamingResponse
+from utils.export_pool import ambilSlotEkspor, jagaSlot, render
 
-def generate_csv_response(data, filename="data.csv"):
-    output = io.StringIO()
-    writer = csv.DictWriter(output, fieldnames=data[0].keys())
-    writer.writeheader()
-    writer.writerows(data)
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+CSV_CHUNK_ROWS = 500           # baris CSV per chunk yang dikirim
+FILE_CHUNK_SIZE = 64 * 1024    # ukuran chunk saat mengirim berkas xlsx
+XLSX_BATCH_ROWS = 500          # baris xlsx per tugas render di export_executor
 
-    headers = {
+def _download_headers(filename):
+    return {
         "Content-Disposition": f'attachment; filename="{filename}"',
         "Access-Control-Expose-Headers": "Content-Disposition",
     }
 
+async def aiter_rows(rows):
+    """Samakan sumber baris: async iterable (mis. cursor Motor) maupun iterable biasa."""
+    if hasattr(rows, "__aiter__"):
+        async for row in rows:
+            yield row
+    else:
+        for row in rows:
+            yield row
+
+def generate_csv_response(rows, filename="data.csv", fieldnames=None):
+    """
+    Stream CSV dari iterable/async iterable berisi dict. Header diambil dari
+    `fieldnames` atau dari key baris pertama; chunk dikirim setiap CSV_CHUNK_ROWS baris.
+    """
+    async def stream():
+        output = io.StringIO()
+        writer = None
+        jumlah = 0
+        async for row in aiter_rows(rows):
+            if writer is None:
+                writer = csv.DictWriter(output, fieldnames=fieldnames or list(row.keys()), extrasaction="ignore")
+                writer.writeheader()
+            writer.writerow(row)
+            jumlah += 1
+            if jumlah % CSV_CHUNK_ROWS == 0:
+                yield output.getvalue()
+                output.seek(0)
+                output.truncate(0)
+
+        if writer is None and fieldnames:
+            csv.DictWriter(output, fieldnames=fieldnames).writeheader()
+        if output.tell():
+            yield output.getvalue()
+
     return StreamingResponse(
-        iter([output.getvalue()]),
+        stream(),
         media_type="text/csv",
-        headers=headers
+        headers=_download_headers(filename)
     )
 
-def generate_excel_response(data, filename="data.xlsx", sheet_name="Sheet1"):
-    df = pd.DataFrame(data)
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        df.to_excel(writer, sheet_name=sheet_name, index=False)
-    output.seek(0)
+def _nilai_sel(value):
+    if value is None or isinstance(value, (str, int, float, bool, datetime, date)):
+        return value
+    return str(value)
 
-    headers = {
-        "Content-Disposition": f'attachment; filename="{filename}"',
-        "Access-Control-Expose-Headers": "Content-Disposition",
-    }
+class _SheetWriter:
+    """Tulis baris dict ke satu worksheet; header diambil dari baris pertama."""
+    def __init__(self, workbook, sheet_name, fieldnames=None, date_format=None):
+        self.worksheet = workbook.add_worksheet(sheet_name)
+        self.fieldnames = fieldnames
+        self.date_format = date_format
+        self.row_index = 0
+        if fieldnames:
+            self._write_header()
+
+    def _write_header(self):
+        self.worksheet.write_row(0, 0, self.fieldnames)
+        self.row_index = 1
+
+    def write(self, row: dict):
+        if self.fieldnames is None:
+            self.fieldnames = list(row.keys())
+            self._write_header()
+        for col, field in enumerate(self.fieldnames):
+            value = _nilai_sel(row.get(field))
+            if isinstance(value, (datetime, date)):
+                self.worksheet.write_datetime(self.row_index, col, value, self.date_format)
+            else:
+                self.worksheet.write(self.row_index, col, value)
+        self.row_index += 1
+
+    def write_many(self, rows: list):
+        for row in rows:
+            self.write(row)
+
+async def _render_per_batch(rows, write_batch):
+    """
+    Kumpulkan baris dari sumber async di event loop, lalu serahkan ke
+    export_executor per XLSX_BATCH_ROWS baris. Batch dirender berurutan,
+    jadi workbook tidak pernah disentuh dua thread sekaligus.
+    """
+    batch = []
+    async for row in aiter_rows(rows):
+        batch.append(row)
+        if len(batch) >= XLSX_BATCH_ROWS:
+            await render(write_batch, batch)
+            batch = []
+    if batch:
+        await render(write_batch, batch)
 
+async def _stream_workbook(write_rows, slot):
+    """
+    Bangun workbook xlsxwriter mode constant_memory ke berkas sementara
+    (memori tetap datar berapapun jumlah barisnya), lalu kirim per chunk.
+    Penulisan baris, workbook.close() (kompresi zip) dan pembacaan berkas
+    berjalan di export_executor; event loop hanya membaca cursor.
+    """
+    try:
+        fd, path = tempfile.mkstemp(suffix=".xlsx")
+        os.close(fd)
+        try:
+            workbook = xlsxwriter.Workbook(path, {"constant_memory": True, "remove_timezone": True})
+            date_format = workbook.add_format({"num_format": "yyyy-mm-dd hh:mm:ss"})
+            try:
+                await write_rows(workbook, date_format)
+            finally:
+                await render(workbook.close)
+
+            with open(path, "rb") as f:
+                while chunk := await render(f.read, FILE_CHUNK_SIZE):
+                    yield chunk
+        finally:
+            os.remove(path)
+    finally:
+        slot.lepas()
+
+def _excel_response(write_rows, filename):
+    # Slot diambil sebelum response dikembalikan supaya pool yang penuh
+    # masih bisa dijawab 503, bukan memperlambat semua ekspor
+    slot = ambilSlotEkspor()
     return StreamingResponse(
-        output,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers=headers
+        jagaSlot(_stream_workbook(write_rows, slot), slot),
+        media_type=XLSX_MEDIA_TYPE,
+        headers=_download_headers(filename)
     )
 
-def generate_excel_multisheet_response(sheets: dict, filename="data.xlsx"):
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        for sheet_name, data in sheets.items():
-            df = pd.DataFrame(data)
-            df.to_excel(writer, sheet_name=sheet_name, index=False)
-    output.seek(0)
+def generate_excel_response(rows, filename="data.xlsx", sheet_name="Sheet1", fieldnames=None):
+    async def write_rows(workbook, date_format):
+        sheet = await render(_SheetWriter, workbook, sheet_name, fieldnames, date_format)
+        await _render_per_batch(rows, sheet.write_many)
 
-    headers = {
-        "Content-Disposition": f'attachment; filename="{filename}"',
-        "Access-Control-Expose-Headers": "Content-Disposition",
-    }
+    return _excel_response(write_rows, filename)
 
-    return StreamingResponse(
-        output,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers=headers
-    )
\ No newline at end of file
+def generate_excel_multisheet_response(sheet_rows, sheets: dict, filename="data.xlsx"):
+    """
+    `sheet_rows` berisi pasangan (nama_sheet, baris) sehingga satu cursor bisa
+    mengisi beberapa sheet sekaligus. `sheets` memetakan nama sheet ke daftar
+    kolomnya (atau None untuk memakai key baris pertama), urutannya menjadi urutan sheet.
+    """
+    async def write_rows(workbook, date_format):
+        writers = {
+            sheet_name: _SheetWriter(workbook, sheet_name, fieldnames, date_format)
+            for sheet_name, fieldnames in sheets.items()
+        }
+
+        def write_batch(batch):
+            for sheet_name, row in batch:
+                writers[sheet_name].write(row)
+
+        await _render_per_batch(sheet_rows, write_batch)
+
+    return _excel_response(write_rows, filename)
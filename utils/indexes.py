@@ -0,0 +1,91 @@
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+from core.logger import logger
+
+# Registry index per koleksi. Nama index ditentukan eksplisit supaya
+# pembuatan ulang saat startup bersifat idempoten.
+INDEXES = {
+    "barang": [
+        IndexModel([("parent_id", ASCENDING), ("nama", ASCENDING), ("_id", ASCENDING)], name="parent_id_1_nama_1__id_1"),
+    ],
+    "barang_hirarki": [
+        IndexModel([("childId", ASCENDING)], name="childId_1"),
+        IndexModel([("parentId", ASCENDING)], name="parentId_1"),
+    ],
+    "barang_sirkulasi": [
+        IndexModel([("id_formulir", ASCENDING)], name="id_formulir_1"),
+    ],
+    "formulir_sirkulasi_barang": [
+        IndexModel([("tanggal_pencatatan", DESCENDING), ("_id", DESCENDING)], name="tanggal_pencatatan_-1__id_-1"),
+    ],
+    "nilai_kelompok": [
+        IndexModel([("id_kelompok", ASCENDING), ("id_penilai", ASCENDING)], name="id_kelompok_1_id_penilai_1"),
+    ],
+    "nilai_perorangan": [
+        IndexModel([("id_mahasiswa", ASCENDING), ("id_penilai", ASCENDING)], name="id_mahasiswa_1_id_penilai_1"),
+    ],
+    "rekap_nilai": [
+        IndexModel([("id_subjek", ASCENDING), ("jenis", ASCENDING)], name="id_subjek_1_jenis_1", unique=True),
+    ],
+    "users": [
+        IndexModel([("nim", ASCENDING)], name="nim_1"),
+    ],
+    "aspek_penilaian_kelompok": [
+        IndexModel([("tahun", ASCENDING), ("isParent", ASCENDING)], name="tahun_1_isParent_1"),
+        IndexModel([("parentId", ASCENDING)], name="parentId_1"),
+    ],
+    "aspek_penilaian_perorangan": [
+        IndexModel([("tahun", ASCENDING), ("isParent", ASCENDING)], name="tahun_1_isParent_1"),
+        IndexModel([("parentId", ASCENDING)], name="parentId_1"),
+    ],
+    "sessions": [
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "session_revocations": [
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+}
+
+async def ensure_indexes(db):
+    """Buat semua index di registry. Aman dipanggil berulang kali."""
+    for collection_name, indexes in INDEXES.items():
+        try:
+            await db[collection_name].create_indexes(indexes)
+        except OperationFailure as e:
+            # Biasanya index dengan key sama tapi opsi/nama berbeda sudah ada
+            logger.warning("Gagal membuat index untuk '%s': %s", collection_name, e)
+
+def _key_spec(key) -> tuple:
+    return tuple((field, int(direction) if isinstance(direction, (int, float)) else direction) for field, direction in key.items())
+
+async def audit_indexes(db):
+    """
+    Bandingkan registry dengan index yang ada di database dan laporkan
+    index yang belum dibuat serta index yang tidak pernah dipakai ($indexStats).
+    """
+    report = {}
+    for collection_name, indexes in INDEXES.items():
+        collection = db[collection_name]
+        existing = {}
+        async for index in collection.list_indexes():
+            existing[_key_spec(index["key"])] = index["name"]
+
+        missing = [
+            index.document["name"]
+            for index in indexes
+            if _key_spec(index.document["key"]) not in existing
+        ]
+
+        stats = await collection.aggregate([{"$indexStats": {}}]).to_list(length=None)
+        unused = [
+            {"name": stat["name"], "since": stat["accesses"]["since"]}
+            for stat in stats
+            if stat["name"] != "_id_" and stat["accesses"]["ops"] == 0
+        ]
+
+        report[collection_name] = {
+            "missing": missing,
+            "unused": unused,
+            "usage": {stat["name"]: stat["accesses"]["ops"] for stat in stats},
+        }
+    return report
@@ -0,0 +1,55 @@
+from typing import Any, Callable
+import orjson
+from bson import ObjectId, Decimal128
+from fastapi import Request, Response
+from fastapi.encoders import ENCODERS_BY_TYPE
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+def bson_default(obj: Any):
+    """Fallback orjson untuk tipe BSON yang tidak dikenal orjson."""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, Decimal128):
+        return str(obj.to_decimal())
+    raise TypeError
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=bson_default, option=ORJSON_OPTIONS)
+
+def daftarkanEncoderBSON():
+    """
+    Daftarkan ObjectId ke jsonable_encoder FastAPI (global), dipanggil sekali
+    saat setup aplikasi di main.py. Perlu untuk handler yang mengembalikan nilai
+    biasa: FastAPI tetap menjalankan jsonable_encoder pada nilai tersebut.
+    """
+    ENCODERS_BY_TYPE[ObjectId] = str
+
+class BSONJSONResponse(JSONResponse):
+    """
+    Response JSON yang di-render dengan orjson (ObjectId, Decimal128, datetime,
+    numpy). Sebagai default_response_class, nilai kembalian handler tetap
+    melewati jsonable_encoder FastAPI lebih dulu; handler yang mengembalikan
+    BSONJSONResponse(...) langsung dilewati encoder itu dan diserialisasi sekali.
+    """
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+class ORJSONRequest(Request):
+    async def json(self) -> Any:
+        if not hasattr(self, "_json"):
+            self._json = orjson.loads(await self.body())
+        return self._json
+
+class ORJSONRoute(APIRoute):
+    """Route yang memakai orjson untuk `await request.json()`."""
+    def get_route_handler(self) -> Callable:
+        original_route_handler = super().get_route_handler()
+
+        async def custom_route_handler(request: Request) -> Response:
+            request = ORJSONRequest(request.scope, request.receive)
+            return await original_route_handler(request)
+
+        return custom_route_handler
@@ -0,0 +1,64 @@
+import base64
+from typing import List, Optional, Tuple
+import bson
+from bson.errors import BSONError
+from fastapi import HTTPException
+
+def encode_cursor(values: list) -> str:
+    """Cursor opaque: nilai kunci urutan dokumen terakhir, di-encode BSON + base64url."""
+    return base64.urlsafe_b64encode(bson.encode({"v": values})).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return bson.decode(base64.urlsafe_b64decode(padded))["v"]
+    except (ValueError, KeyError, BSONError):
+        raise HTTPException(status_code=400, detail="Cursor 'after' tidak valid")
+
+def _setelah(field: str, direction: int, value) -> Optional[dict]:
+    """
+    Kondisi "nilai `field` terurut setelah `value`". Mongo mengurutkan null/field
+    kosong paling awal, sedangkan $gt/$lt terhadap null (dan $lt terhadap nilai
+    biasa) tidak pernah cocok dengan null karena type bracketing, jadi null
+    ditangani eksplisit. None berarti tidak ada dokumen setelah `value`.
+    """
+    if direction == 1:
+        return {field: {"$ne": None}} if value is None else {field: {"$gt": value}}
+    if value is None:
+        return None
+    return {"$or": [{field: {"$lt": value}}, {field: None}]}
+
+def keyset_stages(sort_fields: List[Tuple[str, int]], limit: int, after: Optional[str] = None) -> list:
+    """
+    Tahap pipeline keyset pagination: $match posisi setelah cursor, $sort, $limit.
+    `sort_fields` berupa [(field, 1|-1), ...] dan harus diakhiri field unik (mis. _id)
+    serta didukung index dengan urutan yang sama, supaya halaman ke-N sama murahnya dengan halaman pertama.
+    Limit diambil satu lebih untuk mengetahui apakah masih ada halaman berikutnya.
+    """
+    stages = []
+    if after:
+        values = decode_cursor(after)
+        if len(values) != len(sort_fields):
+            raise HTTPException(status_code=400, detail="Cursor 'after' tidak valid")
+
+        # (a > x) OR (a = x AND b > y) OR ...
+        kondisi = []
+        for i, (field, direction) in enumerate(sort_fields):
+            setelah = _setelah(field, direction, values[i])
+            if setelah is None:
+                continue
+            kondisi.append({**{sort_fields[j][0]: values[j] for j in range(i)}, **setelah})
+        stages.append({"$match": {"$or": kondisi} if kondisi else {"_id": {"$exists": False}}})
+
+    stages.append({"$sort": dict(sort_fields)})
+    stages.append({"$limit": limit + 1})
+    return stages
+
+def keyset_page(docs: list, sort_fields: List[Tuple[str, int]], limit: int) -> dict:
+    """Potong hasil keyset_stages menjadi satu halaman beserta cursor halaman berikutnya."""
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        last = docs[-1]
+        next_cursor = encode_cursor([last.get(field) for field, _ in sort_fields])
+    return {"data": docs, "next": next_cursor}
@@ -0,0 +1,92 @@
+import threading
+import time
+from pymongo import monitoring
+
+class PoolStatistik(monitoring.ConnectionPoolListener):
+    """
+    Statistik connection pool Mongo per server: koneksi yang sedang dipinjam,
+    waktu tunggu checkout, kegagalan checkout, dan event pool cleared.
+    Event dipanggil dari thread executor Motor, jadi akses dilindungi lock.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._servers = {}
+
+    def _server(self, address):
+        key = f"{address[0]}:{address[1]}" if isinstance(address, tuple) else str(address)
+        server = self._servers.get(key)
+        if server is None:
+            server = self._servers[key] = {
+                "koneksi_terbuka": 0,
+                "dipinjam": 0,
+                "dipinjam_maks": 0,
+                "checkout": 0,
+                "checkout_gagal": {},
+                "tunggu_total_ms": 0.0,
+                "tunggu_maks_ms": 0.0,
+                "pool_cleared": 0,
+                "pool_cleared_terakhir": None,
+            }
+        return server
+
+    def pool_created(self, event):
+        with self._lock:
+            self._server(event.address)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            server = self._server(event.address)
+            server["pool_cleared"] += 1
+            server["pool_cleared_terakhir"] = time.time()
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self._server(event.address)["koneksi_terbuka"] += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self._server(event.address)["koneksi_terbuka"] -= 1
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            gagal = self._server(event.address)["checkout_gagal"]
+            gagal[event.reason] = gagal.get(event.reason, 0) + 1
+
+    def connection_checked_out(self, event):
+        tunggu_ms = (getattr(event, "duration", None) or 0) * 1000
+        with self._lock:
+            server = self._server(event.address)
+            server["checkout"] += 1
+            server["dipinjam"] += 1
+            server["dipinjam_maks"] = max(server["dipinjam_maks"], server["dipinjam"])
+            server["tunggu_total_ms"] += tunggu_ms
+            server["tunggu_maks_ms"] = max(server["tunggu_maks_ms"], tunggu_ms)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self._server(event.address)["dipinjam"] -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                key: {
+                    **server,
+                    "checkout_gagal": dict(server["checkout_gagal"]),
+                    "tunggu_rata_ms": server["tunggu_total_ms"] / server["checkout"] if server["checkout"] else 0.0,
+                }
+                for key, server in self._servers.items()
+            }
+
+pool_statistik = PoolStatistik()
@@ -0,0 +1,166 @@
+import contextvars
+import json
+import threading
+import time
+from collections import deque
+from pymongo import monitoring
+from core.cache import TTLCache
+from core.config import settings
+from core.logger import logger
+
+# Command yang bisa di-explain; command lain (termasuk explain itu sendiri) dilewati
+COMMAND_EXPLAIN = {"aggregate", "find", "count", "distinct", "update", "delete", "findAndModify"}
+
+# Field amplop command yang tidak boleh ikut dikirim ke explain
+FIELD_AMPLOP = {"lsid", "txnNumber", "autocommit", "startTransaction", "readConcern", "writeConcern"}
+
+def _bentuk(value):
+    if isinstance(value, dict):
+        return {key: _bentuk(item) for key, item in value.items()}
+    if isinstance(value, list):
+        if any(isinstance(item, dict) for item in value):
+            return [_bentuk(item) for item in value]
+        return "?"
+    if isinstance(value, str) and value.startswith("$"):
+        return value
+    return "?"
+
+def perintahExplain(command) -> dict:
+    """Command tanpa field amplop (session, transaksi, $db, $clusterTime, ...) untuk dikirim ke explain."""
+    return {key: value for key, value in command.items() if key not in FIELD_AMPLOP and not key.startswith("$")}
+
+def bentukCommand(command) -> dict:
+    """
+    Normalisasi command menjadi bentuknya saja: nilai literal diganti "?",
+    array literal (mis. isi $in) diringkas menjadi "?", sedangkan nama field,
+    operator, dan path "$field" / "$$variabel" dipertahankan. Nama koleksi
+    (nilai key pertama) ikut dipertahankan.
+    """
+    target = perintahExplain(command)
+    bentuk = _bentuk(target)
+    if target:
+        nama_command = next(iter(target))
+        bentuk[nama_command] = target[nama_command]
+    return bentuk
+
+def ringkasRencana(explain: dict) -> dict:
+    """Ringkas hasil explain executionStats: tahap plan, COLLSCAN/IXSCAN, dokumen diperiksa vs dikembalikan."""
+    tahap = set()
+    ringkasan = {"docs_examined": 0, "keys_examined": 0, "n_returned": None, "lookup": []}
+
+    def telusuri(node):
+        if isinstance(node, dict):
+            if isinstance(node.get("stage"), str):
+                tahap.add(node["stage"])
+            stats = node.get("executionStats")
+            if isinstance(stats, dict):
+                ringkasan["docs_examined"] += stats.get("totalDocsExamined", 0)
+                ringkasan["keys_examined"] += stats.get("totalKeysExamined", 0)
+                if ringkasan["n_returned"] is None:
+                    ringkasan["n_returned"] = stats.get("nReturned")
+            if isinstance(node.get("$lookup"), dict) and "collectionScans" in node:
+                ringkasan["docs_examined"] += node.get("totalDocsExamined", 0)
+                ringkasan["keys_examined"] += node.get("totalKeysExamined", 0)
+                ringkasan["lookup"].append({
+                    "from": node["$lookup"].get("from"),
+                    "collection_scans": node["collectionScans"],
+                    "indexes_used": node.get("indexesUsed", []),
+                })
+            for item in node.values():
+                telusuri(item)
+        elif isinstance(node, list):
+            for item in node:
+                telusuri(item)
+
+    telusuri(explain)
+    ada_collscan = "COLLSCAN" in tahap or any(item["collection_scans"] for item in ringkasan["lookup"])
+    ringkasan["scan"] = "COLLSCAN" if ada_collscan else "IXSCAN" if "IXSCAN" in tahap else None
+    ringkasan["tahap"] = sorted(tahap)
+    return ringkasan
+
+class SlowQueryProfiler(monitoring.CommandListener):
+    """
+    Catat command Mongo yang lebih lambat dari `ambang_ms` ke ring buffer,
+    lalu jalankan explain untuk bentuk command tersebut di event loop aplikasi
+    (listener dipanggil dari thread executor Motor, jadi tidak boleh menunggu di sini).
+    Hasil explain di-cache per bentuk command supaya query lambat yang berulang
+    tidak memicu explain berulang.
+    """
+    def __init__(self, ambang_ms, kapasitas: int = 100, explain_ttl: int = 300):
+        self.ambang_ms = ambang_ms
+        self._lock = threading.Lock()
+        self._entri = deque(maxlen=kapasitas)
+        self._pending = {}
+        self._rencana = TTLCache(maxsize=kapasitas, ttl=explain_ttl)
+        self._loop = None
+        self._client = None
+
+    def attach(self, loop, client):
+        """Dipanggil di lifespan: explain dijalankan di loop dan client milik worker ini."""
+        self._loop = loop
+        self._client = client
+
+    def detach(self):
+        self._loop = None
+        self._client = None
+
+    def started(self, event):
+        if event.command_name in COMMAND_EXPLAIN:
+            self._pending[event.request_id] = (event.database_name, event.command)
+
+    def succeeded(self, event):
+        pending = self._pending.pop(event.request_id, None)
+        if pending is None or event.duration_micros < self.ambang_ms * 1000:
+            return
+
+        database_name, command = pending
+        entri = {
+            "waktu": time.time(),
+            "database": database_name,
+            "collection": command.get(event.command_name),
+            "command": event.command_name,
+            "durasi_ms": event.duration_micros / 1000,
+            "bentuk": bentukCommand(command),
+            "rencana": None,
+        }
+        with self._lock:
+            self._entri.append(entri)
+
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            # Thread executor Motor berjalan di context request; explain dijadwalkan
+            # di context kosong supaya tidak ikut terhitung di query_stats_var
+            # (Server-Timing, budget) atau memakai DataLoader request tersebut
+            coro = self._explain(entri, database_name, command)
+            loop.call_soon_threadsafe(lambda: loop.create_task(coro), context=contextvars.Context())
+
+    def failed(self, event):
+        self._pending.pop(event.request_id, None)
+
+    async def _explain(self, entri, database_name, command):
+        kunci = json.dumps([database_name, entri["bentuk"]], default=str)
+        rencana = self._rencana.get(kunci)
+        if rencana is None:
+            try:
+                explain = await self._client[database_name].command({
+                    "explain": perintahExplain(command),
+                    "verbosity": "executionStats"
+                })
+                rencana = ringkasRencana(explain)
+            except Exception as e:
+                logger.warning("Explain query lambat gagal untuk %s.%s: %s", database_name, entri["collection"], e)
+                rencana = {"error": str(e)}
+            self._rencana.set(kunci, rencana)
+        with self._lock:
+            entri["rencana"] = rencana
+
+    def stats(self) -> dict:
+        with self._lock:
+            entri = [dict(item) for item in reversed(self._entri)]
+        return {"ambang_ms": self.ambang_ms, "entri": entri}
+
+    def clear(self):
+        with self._lock:
+            self._entri.clear()
+
+slow_query_profiler = SlowQueryProfiler(settings.profiler_slow_ms, settings.profiler_buffer_size)
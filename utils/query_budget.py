@@ -0,0 +1,101 @@
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pymongo import monitoring
+from core.metrics import command_collection
+
+class StatistikQuery:
+    """
+    Command Mongo yang dijalankan dalam satu request (atau satu blok hitungQueryMongo).
+    Listener dipanggil dari beberapa thread executor Motor sekaligus, jadi data
+    hanya ditambah lewat list.append (atomik) dan dijumlahkan saat dibaca.
+    """
+    __slots__ = ("induk", "commands", "durasi_micros")
+
+    def __init__(self, induk=None):
+        self.induk = induk
+        self.commands = []
+        self.durasi_micros = []
+
+    @property
+    def jumlah(self) -> int:
+        return len(self.commands)
+
+    @property
+    def durasi_ms(self) -> float:
+        return sum(self.durasi_micros) / 1000
+
+    def rincian(self) -> dict:
+        """Jumlah command per "koleksi.command", untuk melacak pola N+1."""
+        hasil = {}
+        for command_name, collection in list(self.commands):
+            kunci = f"{collection}.{command_name}" if collection else command_name
+            hasil[kunci] = hasil.get(kunci, 0) + 1
+        return hasil
+
+# Statistik request aktif; ikut ke thread executor Motor lewat context
+query_stats_var = ContextVar("query_stats", default=None)
+
+class QueryBudgetListener(monitoring.CommandListener):
+    def started(self, event):
+        stats = query_stats_var.get()
+        if stats is None:
+            return
+        item = (event.command_name, command_collection(event))
+        while stats is not None:
+            stats.commands.append(item)
+            stats = stats.induk
+
+    def succeeded(self, event):
+        self._durasi(event)
+
+    def failed(self, event):
+        self._durasi(event)
+
+    def _durasi(self, event):
+        stats = query_stats_var.get()
+        while stats is not None:
+            stats.durasi_micros.append(event.duration_micros)
+            stats = stats.induk
+
+query_budget_listener = QueryBudgetListener()
+
+@contextmanager
+def hitungQueryMongo():
+    """
+    Hitung command Mongo di dalam blok, termasuk yang dijalankan request
+    in-process (httpx ASGITransport) di task yang sama.
+
+        with hitungQueryMongo() as stats:
+            await client.get("/inventaris/barang/")
+        assert stats.jumlah <= 3, stats.rincian()
+    """
+    stats = StatistikQuery(induk=query_stats_var.get())
+    token = query_stats_var.set(stats)
+    try:
+        yield stats
+    finally:
+        query_stats_var.reset(token)
+
+@contextmanager
+def maksimalQueryMongo(maks: int):
+    """Seperti hitungQueryMongo, tapi AssertionError jika blok memakai lebih dari `maks` command."""
+    with hitungQueryMongo() as stats:
+        yield stats
+    assert stats.jumlah <= maks, f"{stats.jumlah} command Mongo (maksimal {maks}): {stats.rincian()}"
+
+def serverTiming(stats: StatistikQuery) -> str:
+    return f'mongo;dur={stats.durasi_ms:.2f};desc="{stats.jumlah} command"'
+
+_SERVER_TIMING_MONGO = re.compile(r'mongo;dur=[\d.]+;desc="(\d+) command"')
+
+def jumlahQueryDariResponse(response) -> int:
+    """
+    Jumlah command Mongo dari header Server-Timing sebuah response, untuk test
+    yang memakai TestClient (request dijalankan di thread lain sehingga
+    hitungQueryMongo tidak bisa dipakai). Hanya mencakup command sebelum header dikirim.
+    """
+    cocok = _SERVER_TIMING_MONGO.search(response.headers.get("server-timing", ""))
+    if cocok is None:
+        raise AssertionError("Response tidak membawa Server-Timing mongo")
+    return int(cocok.group(1))